@@ -0,0 +1,297 @@
+"""
+Load test of the v0 API. Seeds synthetic users, each owning a deep task chain
+and a wide task fan-out, then drives the app through the Flask test client
+and through a real WSGI server, reporting the latency, throughput and
+number of SQL statements of login, task listing, search, subtree moves and
+subtree removal.
+
+    python -m benchmarks.api [--users N] [--depth N] [--width N] [--runs N]
+                             [--driver client|wsgi|all]
+                             [--save benchmarks/baseline.json]
+                             [--compare benchmarks/baseline.json]
+
+`--save` writes the results to a JSON file, `--compare` prints them next to
+the results saved earlier. Passwords are hashed with `--bcrypt-rounds` (4 by
+default) so that the login numbers show the overhead of the app rather than
+bcrypt; see `benchmarks.bcrypt_cost` for the latter.
+"""
+import json
+import logging
+import os
+import random
+from argparse import ArgumentParser
+from http.client import HTTPConnection
+from threading import Thread
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.common import (
+    setup_app, QueryCounter, measure, measure_with_setup, summarize, print_table
+)
+
+PASSWORD = "benchmark"
+WORDS = (
+    "buy", "milk", "call", "mom", "write", "report", "fix", "bike", "book", "flight", "pay",
+    "rent", "read", "paper", "plan", "trip", "clean", "garage", "water", "plants"
+)
+DELETE_CHAIN = 10  # depth of the subtree removed by the delete scenario
+DELETE_WIDTH = 40  # number of leaves of that subtree
+
+
+class TestClientDriver:
+    """
+    Sends requests through the Flask test client, in-process.
+    """
+    name = "client"
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, body=None, headers: Dict = None) \
+            -> Tuple[int, bytes]:
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.data
+
+    def close(self):
+        pass
+
+
+class WSGIServerDriver:
+    """
+    Sends requests over HTTP to the app served by a threaded Werkzeug WSGI
+    server running in the background.
+    """
+    name = "wsgi"
+
+    def __init__(self, app):
+        # pylint: disable=import-outside-toplevel
+        from werkzeug.serving import make_server
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.conn = HTTPConnection("127.0.0.1", self.server.server_port)
+
+    def request(self, method: str, path: str, body=None, headers: Dict = None) \
+            -> Tuple[int, bytes]:
+        headers = dict(headers or ())
+        data = None
+        if body is not None:
+            data = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        self.conn.request(method, path, body=data, headers=headers)
+        response = self.conn.getresponse()
+        return response.status, response.read()
+
+    def close(self):
+        self.conn.close()
+        self.server.shutdown()
+
+
+def add_tree(tasks: List[Dict], links: List[Dict], nodes: List[Tuple[int, Optional[int]]],
+             owner: int):
+    """
+    Adds tasks and their closure table links for a list of `(id, parent_id)`
+    pairs, parents going before their children.
+    """
+    ancestors: Dict[int, List[int]] = dict()
+    for task_id, parent_id in nodes:
+        tasks.append({
+            "id": task_id,
+            "owner": owner,
+            "text": " ".join(random.sample(WORDS, 3)) + f" {task_id}",
+            "parent_id": parent_id,
+            "status": 0,
+            "creation_time": task_id,
+            "last_mod_time": task_id
+        })
+        ancestors[task_id] = [] if parent_id is None else [parent_id] + ancestors[parent_id]
+        links.append({"ancestor": task_id, "descendant": task_id, "depth": 0})
+        for depth, ancestor in enumerate(ancestors[task_id], start=1):
+            links.append({"ancestor": ancestor, "descendant": task_id, "depth": depth})
+
+
+def seed(app, users: int, depth: int, width: int) -> Dict[str, int]:
+    """
+    Creates `users` users. Every one of them owns a chain of `depth` nested
+    tasks and a task with `width` subtasks. Returns the IDs of the tasks of
+    the first user the scenarios work with.
+    """
+    # pylint: disable=import-outside-toplevel
+    from project_amber.controllers.auth import gen_hashed_pw
+    from project_amber.db import db
+    from project_amber.models.auth import User
+    from project_amber.models.task import Task, TaskTree
+
+    random.seed(1)
+    hashed_pw = gen_hashed_pw(PASSWORD)
+    next_id = 1
+    ids = dict()
+    with app.app_context():
+        db.session.bulk_insert_mappings(User, [{
+            "id": uid,
+            "name": f"user{uid}",
+            "password": hashed_pw
+        } for uid in range(1, users + 1)])
+        for uid in range(1, users + 1):
+            tasks, links = list(), list()
+            chain = list(range(next_id, next_id + depth))
+            nodes = [(task_id, task_id - 1 if task_id > chain[0] else None) for task_id in chain]
+            next_id += depth
+            wide_root = next_id
+            nodes.append((wide_root, None))
+            leaves = range(wide_root + 1, wide_root + width + 1)
+            nodes.extend((task_id, wide_root) for task_id in leaves)
+            next_id += width + 1
+            add_tree(tasks, links, nodes, uid)
+            db.session.bulk_insert_mappings(Task, tasks)
+            db.session.bulk_insert_mappings(TaskTree, links)
+            if uid == 1:
+                ids = {"chain_root": chain[0], "chain_second": chain[1], "wide_root": wide_root}
+        db.session.commit()
+    return ids
+
+
+def run_scenarios(app, driver, ids: Dict[str, int], runs: int) -> List[Dict]:
+    """
+    Runs every scenario with a driver. Returns a result row per scenario.
+    """
+    # pylint: disable=import-outside-toplevel
+    from project_amber.const import AUTH_TOKEN_HEADER, AUTH_TOKEN_SCHEME
+    from project_amber.db import db
+
+    def call(method: str, path: str, body=None, auth: bool = True) -> bytes:
+        headers = {AUTH_TOKEN_HEADER: f"{AUTH_TOKEN_SCHEME} {token}"} if auth else None
+        status, data = driver.request(method, path, body, headers)
+        assert status == 200, (method, path, status, data)
+        return data
+
+    token = ""
+    login_body = {"username": "user1", "password": PASSWORD}
+    token = json.loads(call("POST", "/v0/login", login_body, auth=False))["token"]
+    moves = [ids["wide_root"], ids["chain_root"]]
+
+    def move(_=None):
+        moves.reverse()
+        call("PATCH", f"/v0/task/{ids['chain_second']}", {"parent_id": moves[0]})
+
+    def new_subtree() -> int:
+        operations = [{"op": "create", "ref": "0", "task": {"text": "delete me"}}]
+        for i in range(1, DELETE_CHAIN):
+            operations.append({
+                "op": "create",
+                "ref": str(i),
+                "task": {"text": "delete me", "parent_id": str(i - 1)}
+            })
+        for _ in range(DELETE_WIDTH):
+            operations.append({
+                "op": "create", "task": {"text": "delete me", "parent_id": str(DELETE_CHAIN - 1)}
+            })
+        return json.loads(call("POST", "/v0/task/batch", operations))["ids"]["0"]
+
+    def delete(task_id: int):
+        call("DELETE", f"/v0/task/{task_id}")
+
+    scenarios = (
+        ("login", None, lambda _=None: call("POST", "/v0/login", login_body, auth=False)),
+        ("list", None, lambda _=None: call("GET", "/v0/task")),
+        ("list_page", None, lambda _=None: call("GET", "/v0/task?limit=100")),
+        ("search", None, lambda _=None: call("GET", f"/v0/task?query={random.choice(WORDS)}")),
+        ("move_subtree", None, move),
+        ("delete_subtree", new_subtree, delete)
+    )
+    rows = list()
+    for name, setup, fn in scenarios:
+        # warm up first, so that one-off lookups are not counted
+        for counter in (QueryCounter(db.engine), QueryCounter(db.engine)):
+            arg = setup() if setup else None
+            with counter:
+                fn(arg)
+        if setup:
+            samples = measure_with_setup(setup, fn, runs)
+        else:
+            samples = measure(fn, runs)
+        rows.append({
+            "driver": driver.name,
+            "scenario": name,
+            "queries": counter.count,
+            **summarize(samples)
+        })
+    return rows
+
+
+def compare(rows: List[Dict], baseline_path: str) -> List[Dict]:
+    """
+    Adds the p50 latency and query count of a saved baseline to the result
+    rows, together with the relative change of p50.
+    """
+    with open(baseline_path, encoding="utf8") as baseline_file:
+        baseline = json.load(baseline_file)
+    saved = {(row["driver"], row["scenario"]): row for row in baseline["results"]}
+    compared = list()
+    for row in rows:
+        base = saved.get((row["driver"], row["scenario"]))
+        if base is None:
+            continue
+        change = (row["p50_ms"] / base["p50_ms"] - 1) * 100
+        compared.append({
+            "driver": row["driver"],
+            "scenario": row["scenario"],
+            "queries": row["queries"],
+            "base_queries": base["queries"],
+            "p50_ms": row["p50_ms"],
+            "base_p50_ms": base["p50_ms"],
+            "p50_change": f"{change:+.1f}%"
+        })
+    return compared
+
+
+def main():
+    parser = ArgumentParser(prog="python -m benchmarks.api", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=30)
+    parser.add_argument("--width", type=int, default=300)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--driver", choices=("client", "wsgi", "all"), default="all")
+    parser.add_argument("--save", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    args = parser.parse_args()
+    # `setup_app()` changes the working directory
+    save, baseline = [os.path.abspath(path) if path else None for path in (args.save, args.compare)]
+
+    app = setup_app(bcrypt_rounds=args.bcrypt_rounds)
+    # pylint: disable=import-outside-toplevel
+    from project_amber.db import db
+
+    ids = seed(app, args.users, args.depth, args.width)
+    drivers = [TestClientDriver, WSGIServerDriver]
+    if args.driver != "all":
+        drivers = [driver for driver in drivers if driver.name == args.driver]
+    rows = list()
+    for driver_class in drivers:
+        driver = driver_class(app)
+        try:
+            with app.app_context():
+                rows.extend(run_scenarios(app, driver, ids, args.runs))
+        finally:
+            driver.close()
+    print_table(rows)
+    if baseline:
+        print()
+        print_table(compare(rows, baseline))
+    if save:
+        with app.app_context():
+            database = db.engine.dialect.name
+        params = {key: value for key, value in vars(args).items() if not key in ("save", "compare")}
+        with open(save, "w", encoding="utf8") as baseline_file:
+            results = [{
+                key: round(value, 3) if isinstance(value, float) else value
+                for key, value in row.items()
+            } for row in rows]
+            json.dump({"database": database, "params": params, "results": results},
+                      baseline_file, indent=2)
+            baseline_file.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Compares the query count and latency of a single auth token check: the old
+path (separate `Session` and `User` lookups) against the joined lookup used by
+`login_required`. The token cache is disabled so every check hits the DB.
+
+    python -m benchmarks.auth_lookup [users] [runs]
+"""
+import random
+import sys
+
+from benchmarks.common import setup_app, QueryCounter, measure, summarize, print_table
+
+
+def main(users: int = 2000, runs: int = 2000):
+    app = setup_app(auth_cache_size=0)
+    # pylint: disable=import-outside-toplevel
+    from project_amber.db import db
+    from project_amber.handlers import lookup_token
+    from project_amber.models.auth import User, Session
+
+    def legacy_lookup(token: str):
+        user_s = db.session.query(Session).filter_by(token=token).one_or_none()
+        user = db.session.query(User).filter_by(id=user_s.user).one_or_none()
+        return user.name, user.id, user_s.login_time
+
+    with app.app_context():
+        db.session.bulk_insert_mappings(User, [{
+            "id": uid,
+            "name": f"user{uid}",
+            "password": "-"
+        } for uid in range(1, users + 1)])
+        tokens = [f"token-{uid}-{n}" for uid in range(1, users + 1) for n in range(3)]
+        db.session.bulk_insert_mappings(Session, [{
+            "token": token,
+            "user": int(token.split("-")[1]),
+            "login_time": 0,
+            "address": "127.0.0.1"
+        } for token in tokens])
+        db.session.commit()
+
+        rows = list()
+        for name, lookup in (("before", legacy_lookup), ("after", lookup_token)):
+            assert lookup(tokens[0]) == ("user1", 1, 0)
+            db.session.remove()
+            with QueryCounter(db.engine) as counter:
+                lookup(random.choice(tokens))
+            # pylint: disable=cell-var-from-loop
+            samples = measure(lambda: lookup(random.choice(tokens)), runs)
+            rows.append({"path": name, "queries": counter.count, **summarize(samples)})
+        print_table(rows)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
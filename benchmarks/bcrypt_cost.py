@@ -0,0 +1,49 @@
+"""
+Reports the latency of `POST /v0/login` at a range of bcrypt costs, plus the
+one-off latency of the login that rehashes a password from the default cost
+to the tested one.
+
+    python -m benchmarks.bcrypt_cost [min_rounds] [max_rounds] [runs]
+"""
+import sys
+from time import perf_counter
+
+from benchmarks.common import setup_app, measure, summarize, print_table
+
+PASSWORD = "correct horse battery staple"
+
+
+def main(min_rounds: int = 10, max_rounds: int = 14, runs: int = 20):
+    app = setup_app()
+    # pylint: disable=import-outside-toplevel
+    from project_amber.config import config
+    from project_amber.controllers.auth import gen_hashed_pw
+    from project_amber.db import db
+    from project_amber.models.auth import User
+
+    client = app.test_client()
+    default_rounds = config.bcrypt_rounds
+
+    def login(name: str):
+        response = client.post("/v0/login", json={"username": name, "password": PASSWORD})
+        assert response.status_code == 200, response.data
+
+    rows = list()
+    for rounds in range(min_rounds, max_rounds + 1):
+        name = f"user{rounds}"
+        with app.app_context():
+            config.bcrypt_rounds = default_rounds
+            db.session.add(User(name=name, password=gen_hashed_pw(PASSWORD)))
+            db.session.commit()
+        config.bcrypt_rounds = rounds
+        start = perf_counter()
+        login(name)
+        rehash_ms = (perf_counter() - start) * 1000
+        # pylint: disable=cell-var-from-loop
+        samples = measure(lambda: login(name), runs)
+        rows.append({"rounds": rounds, "rehash_ms": round(rehash_ms, 2), **summarize(samples)})
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
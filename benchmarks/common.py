@@ -0,0 +1,121 @@
+"""
+Shared helpers for the benchmark scripts. Run the scripts from the repository
+root, e.g. `python -m benchmarks.auth_lookup`. Set `AMBER_BENCH_DATABASE` to an
+SQLAlchemy URL to benchmark against a database other than a fresh SQLite file.
+"""
+import json
+import os
+import sys
+import tempfile
+from statistics import mean
+from time import perf_counter
+from typing import Callable, Dict, List
+
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_app(**config):
+    """
+    Loads the app against a throwaway config and an empty database.
+    `project_amber.config` reads `config.json` from the working directory at
+    import time, so this writes one into a temporary directory and switches
+    to it before importing the app. Returns the Flask app.
+    """
+    workdir = tempfile.mkdtemp(prefix="amber-bench-")
+    database = os.getenv("AMBER_BENCH_DATABASE") or f"sqlite:///{workdir}/amber.db"
+    settings = {"database": database, "allow_signup": True, "loglevel": 0}
+    settings.update(config)
+    with open(os.path.join(workdir, "config.json"), "w", encoding="utf8") as config_file:
+        json.dump(settings, config_file)
+    os.chdir(workdir)
+    if not ROOT in sys.path:
+        sys.path.insert(0, ROOT)
+    # pylint: disable=import-outside-toplevel
+    from project_amber.app import app
+    from project_amber.db import db
+    from project_amber.migrations import migrate
+    from project_amber.search import drop_search
+    with app.app_context():
+        drop_search(db.engine)
+        db.drop_all()
+        migrate(db.engine)
+    return app
+
+
+class QueryCounter:
+    """
+    Context manager that counts SQL statements sent to an engine.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *_):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *_):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def measure(fn: Callable, runs: int) -> List[float]:
+    """
+    Calls `fn` `runs` times, returns the list of call durations in seconds.
+    """
+    samples = list()
+    for _ in range(runs):
+        start = perf_counter()
+        fn()
+        samples.append(perf_counter() - start)
+    return samples
+
+
+def measure_with_setup(setup: Callable, fn: Callable, runs: int) -> List[float]:
+    """
+    Same as `measure()`, but calls `setup` before every call of `fn`, passing
+    its result to `fn`. Only `fn` is timed.
+    """
+    samples = list()
+    for _ in range(runs):
+        arg = setup()
+        start = perf_counter()
+        fn(arg)
+        samples.append(perf_counter() - start)
+    return samples
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """
+    Returns p50/p99/mean latency in milliseconds and throughput per second.
+    """
+    return {
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "mean_ms": mean(samples) * 1000,
+        "ops_per_sec": len(samples) / sum(samples)
+    }
+
+
+def print_table(rows: List[Dict]):
+    """
+    Prints a list of dicts with the same keys as a plain text table.
+    """
+    if not rows:
+        return
+    columns = list(rows[0])
+    cells = [[f"{row[c]:.3f}" if isinstance(row[c], float) else str(row[c]) for c in columns]
+             for row in rows]
+    widths = [max(len(c), *(len(line[i]) for line in cells)) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)).rstrip())
+    for line in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(line, widths)).rstrip())
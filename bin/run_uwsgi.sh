@@ -1,9 +1,15 @@
 #!/bin/sh
 
+set -e
+
+# bring the database schema up to date before any worker starts
+python -m project_amber.cli migrate
+
 /usr/local/bin/uwsgi \
     --socket :${UWSGI_PORT} \
     --master \
     --manage-script-name \
     --mount /=project_amber:app \
     --processes ${UWSGI_PROCESSES} \
-    --threads ${UWSGI_THREADS}
+    --threads ${UWSGI_THREADS} \
+    --cache2 name=amber_auth,items=4096,blocksize=256
@@ -1,15 +1,18 @@
-from json import dumps
-
-from flask import Flask
+from flask import Flask, request
 from flask.wrappers import Response
 from flask_cors import CORS
 
 from project_amber.config import config
-from project_amber.db import db
-from project_amber.errors import HTTPError
+from project_amber.const import NEXT_CURSOR_HEADER, ETAG_HEADER, SERVER_TIMING_HEADER
+from project_amber.db import db, engine_options, replica_binds
+from project_amber.diagnostics import init_diagnostics
+from project_amber.errors import HTTPError, error_body
+from project_amber.logging import log_http_error
+from project_amber.metrics import init_metrics
 from project_amber.handlers.const import API_V0
 from project_amber.handlers.auth import auth_handlers as auth
 from project_amber.handlers.session import session_handlers as session
+from project_amber.handlers.metrics import metrics_handlers as metrics
 from project_amber.handlers.misc import misc_handlers as misc
 from project_amber.handlers.task import task_handlers as task
 from project_amber.handlers.users import user_handlers as user
@@ -20,19 +23,27 @@ class JsonResponse(Response):
 
 app = Flask(__name__)
 app.config["SQLALCHEMY_DATABASE_URI"] = config.database
+app.config["SQLALCHEMY_BINDS"] = replica_binds(config.replicas)
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+    config.pool_size, config.pool_max_overflow, config.pool_recycle, config.pool_pre_ping
+)
 app.response_class = JsonResponse
 db.init_app(app)
-CORS(app, resources={r"/*": {"origins": config.domain}})
+CORS(
+    app,
+    resources={r"/*": {"origins": config.domain}},
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER, SERVER_TIMING_HEADER]
+)
 
 for blueprint in (auth, session, misc, task, user):
     app.register_blueprint(blueprint, url_prefix=API_V0)
-
-
-@app.before_first_request
-def create_tables():
-    db.create_all()  # create all tables on first run
+if config.metrics:
+    app.register_blueprint(metrics, url_prefix=API_V0)
+init_metrics(app)
+init_diagnostics(app)
 
 
 @app.errorhandler(HTTPError)
 def handle_HTTP_errors(e):
-    return dumps({"message": e.message}), e.code
+    log_http_error(e.code, e.message, request.method, request.path)
+    return error_body(e.message), e.code, e.headers
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from json import dumps, loads
+from threading import Lock
+from time import monotonic
+from typing import Optional, Tuple
+
+from project_amber.config import config
+from project_amber.logging import warn
+
+CachedSession = Tuple[str, int, int]  # user name, user ID, login time
+
+
+class TokenCache:
+    """
+    Bounded in-process LRU cache that maps auth tokens to the details of the
+    session owner (see `CachedSession`). Entries expire after `ttl` seconds.
+    Safe to use from multiple request threads.
+    """
+    def __init__(self, size: int, ttl: int):
+        self.size = size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, CachedSession]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, token: str) -> Optional[CachedSession]:
+        """
+        Returns the cached session details for a token, or `None` on a cache
+        miss.
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return value
+
+    def set(self, token: str, value: CachedSession):
+        """
+        Caches session details for a token, evicting the least recently used
+        entry if the cache is full.
+        """
+        with self._lock:
+            self._entries[token] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def evict(self, *tokens: str):
+        """
+        Removes the provided tokens from the cache.
+        """
+        with self._lock:
+            for token in tokens:
+                self._entries.pop(token, None)
+
+
+class UWSGITokenCache:
+    """
+    Token cache stored in a uWSGI cache shared between all of the workers
+    of a uWSGI instance. Needs uWSGI to be started with a matching
+    `--cache2 name=<cache_name>,...` option.
+    """
+    def __init__(self, ttl: int, cache_name: str = "amber_auth"):
+        # pylint: disable=import-outside-toplevel,import-error
+        import uwsgi
+        self._uwsgi = uwsgi
+        self.ttl = ttl
+        self.cache_name = cache_name
+
+    def get(self, token: str) -> Optional[CachedSession]:
+        value = self._uwsgi.cache_get(token, self.cache_name)
+        if value is None:
+            return None
+        name, uid, login_time = loads(value)
+        return name, uid, login_time
+
+    def set(self, token: str, value: CachedSession):
+        self._uwsgi.cache_update(token, dumps(value).encode(), self.ttl, self.cache_name)
+
+    def evict(self, *tokens: str):
+        for token in tokens:
+            self._uwsgi.cache_del(token, self.cache_name)
+
+
+class NullTokenCache:
+    """
+    Token cache that never stores anything. Used when caching is disabled.
+    """
+    def get(self, token: str) -> Optional[CachedSession]:  # pylint: disable=unused-argument
+        return None
+
+    def set(self, token: str, value: CachedSession):
+        pass
+
+    def evict(self, *tokens: str):
+        pass
+
+
+def make_token_cache():
+    """
+    Creates the token cache configured with `auth_cache_*` config values.
+    """
+    if config.auth_cache_size <= 0 or config.auth_cache_ttl <= 0:
+        return NullTokenCache()
+    if config.auth_cache_backend == "uwsgi":
+        try:
+            return UWSGITokenCache(config.auth_cache_ttl)
+        except ImportError:
+            warn("Not running under uWSGI, falling back to the local token cache")
+    return TokenCache(config.auth_cache_size, config.auth_cache_ttl)
+
+
+token_cache = make_token_cache()
@@ -0,0 +1,63 @@
+"""
+Administrative commands. Installed as `amber-admin`, also runnable with
+`python -m project_amber.cli`:
+
+    amber-admin migrate   # creates / upgrades the database schema
+    amber-admin status    # prints the schema version and pending migrations
+    amber-admin prune     # removes deletion log entries past their retention
+"""
+import sys
+from argparse import ArgumentParser
+from typing import List, Optional
+
+from project_amber.app import app
+from project_amber.config import config
+from project_amber.controllers.task import prune_tombstones
+from project_amber.db import db
+from project_amber.migrations import migrate, get_schema_version, pending_migrations
+
+
+def migrate_command():
+    """
+    Brings the database schema up to date.
+    """
+    with app.app_context():
+        applied = migrate(db.engine)
+        for version, name, _ in applied:
+            print(f"Applied migration {version}: {name}")
+        print(f"Schema is at version {get_schema_version(db.engine)}")
+
+
+def status_command():
+    """
+    Prints the schema version and the migrations not yet applied.
+    """
+    with app.app_context():
+        print(f"Schema is at version {get_schema_version(db.engine)}")
+        for version, name, _ in pending_migrations(db.engine):
+            print(f"Pending migration {version}: {name}")
+
+
+def prune_command():
+    """
+    Removes the deletion log entries older than `tombstone_retention_days`.
+    """
+    if config.tombstone_retention_days <= 0:
+        print("Deletion log retention is disabled, nothing to prune")
+        return
+    with app.app_context():
+        print(f"Removed {prune_tombstones()} deletion log entries")
+
+
+COMMANDS = {"migrate": migrate_command, "status": status_command, "prune": prune_command}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = ArgumentParser(prog="amber-admin", description="Project Amber administration")
+    parser.add_argument("command", choices=COMMANDS.keys())
+    args = parser.parse_args(argv)
+    COMMANDS[args.command]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,12 +1,41 @@
 import os
 import sys
 from json import load
+from typing import List, Optional
 
 class Config:
     database: str = ""
     loglevel: int = 0
     allow_signup: bool = False
     domain: str = "*"
+    auth_cache_size: int = 1024
+    auth_cache_ttl: int = 60
+    auth_cache_backend: str = "local"
+    search_backend: str = "auto"
+    bcrypt_workers: int = 1
+    bcrypt_queue: int = 0
+    bcrypt_rounds: int = 12
+    pool_size: Optional[int] = None
+    pool_max_overflow: Optional[int] = None
+    pool_recycle: Optional[int] = None
+    pool_pre_ping: bool = False
+    replicas: List[str] = list()
+    metrics: bool = False
+    slow_request_ms: int = 0
+    repeated_query_threshold: int = 0
+    profile_sample_rate: int = 0
+    profile_dir: str = "/tmp/amber-profiles"
+    error_log_rate: int = 10
+    log_format: str = "text"
+    log_file: str = ""
+    log_batch_size: int = 100
+    json_encoder: str = "auto"
+    scheduler_sink: str = "file"
+    scheduler_webhook: str = ""
+    scheduler_file: str = "notifications.jsonl"
+    scheduler_batch_size: int = 100
+    scheduler_interval: int = 10
+    tombstone_retention_days: int = 90
 
 config = Config()
 
@@ -59,7 +88,39 @@ for mapping in (
         # pylint: disable=unnecessary-lambda
         ("AMBER_LOGLEVEL", "loglevel", lambda val: int(val)),  # str -> int
         ("AMBER_ALLOW_SIGNUP", "allow_signup", string_to_bool),  # str -> bool
-        ("AMBER_DOMAIN", "domain", lambda val: val)  # str -> str
+        ("AMBER_DOMAIN", "domain", lambda val: val),  # str -> str
+        ("AMBER_AUTH_CACHE_SIZE", "auth_cache_size", lambda val: int(val)),  # str -> int
+        ("AMBER_AUTH_CACHE_TTL", "auth_cache_ttl", lambda val: int(val)),  # str -> int
+        ("AMBER_AUTH_CACHE_BACKEND", "auth_cache_backend", lambda val: val),  # str -> str
+        ("AMBER_SEARCH_BACKEND", "search_backend", lambda val: val),  # str -> str
+        ("AMBER_BCRYPT_WORKERS", "bcrypt_workers", lambda val: int(val)),  # str -> int
+        ("AMBER_BCRYPT_QUEUE", "bcrypt_queue", lambda val: int(val)),  # str -> int
+        ("AMBER_BCRYPT_ROUNDS", "bcrypt_rounds", lambda val: int(val)),  # str -> int
+        ("AMBER_POOL_SIZE", "pool_size", lambda val: int(val)),  # str -> int
+        ("AMBER_POOL_MAX_OVERFLOW", "pool_max_overflow", lambda val: int(val)),  # str -> int
+        ("AMBER_POOL_RECYCLE", "pool_recycle", lambda val: int(val)),  # str -> int
+        ("AMBER_POOL_PRE_PING", "pool_pre_ping", string_to_bool),  # str -> bool
+        # comma-separated list of URLs
+        ("AMBER_REPLICAS", "replicas", lambda val: [url for url in val.split(",") if url]),
+        ("AMBER_METRICS", "metrics", string_to_bool),  # str -> bool
+        ("AMBER_SLOW_REQUEST_MS", "slow_request_ms", lambda val: int(val)),  # str -> int
+        # str -> int
+        ("AMBER_REPEATED_QUERY_THRESHOLD", "repeated_query_threshold", lambda val: int(val)),
+        ("AMBER_PROFILE_SAMPLE_RATE", "profile_sample_rate", lambda val: int(val)),  # str -> int
+        ("AMBER_PROFILE_DIR", "profile_dir", lambda val: val),  # str -> str
+        ("AMBER_ERROR_LOG_RATE", "error_log_rate", lambda val: int(val)),  # str -> int
+        ("AMBER_LOG_FORMAT", "log_format", lambda val: val),  # str -> str
+        ("AMBER_LOG_FILE", "log_file", lambda val: val),  # str -> str
+        ("AMBER_LOG_BATCH_SIZE", "log_batch_size", lambda val: int(val)),  # str -> int
+        ("AMBER_JSON_ENCODER", "json_encoder", lambda val: val),  # str -> str
+        ("AMBER_SCHEDULER_SINK", "scheduler_sink", lambda val: val),  # str -> str
+        ("AMBER_SCHEDULER_WEBHOOK", "scheduler_webhook", lambda val: val),  # str -> str
+        ("AMBER_SCHEDULER_FILE", "scheduler_file", lambda val: val),  # str -> str
+        # str -> int
+        ("AMBER_SCHEDULER_BATCH_SIZE", "scheduler_batch_size", lambda val: int(val)),
+        ("AMBER_SCHEDULER_INTERVAL", "scheduler_interval", lambda val: int(val)),  # str -> int
+        # str -> int
+        ("AMBER_TOMBSTONE_RETENTION_DAYS", "tombstone_retention_days", lambda val: int(val))
 ):
     env_value = os.getenv(mapping[0])
     if not env_value is None:
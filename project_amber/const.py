@@ -4,6 +4,9 @@ EMPTY_RESP = dumps({})  # Empty response, to be used in requests.
 
 AUTH_TOKEN_HEADER = "Authorization"
 AUTH_TOKEN_SCHEME = "Bearer"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+ETAG_HEADER = "ETag"
+SERVER_TIMING_HEADER = "Server-Timing"
 
 DAY_SECONDS = 60 * 60 * 24
 MATURE_SESSION = DAY_SECONDS * 2  # The difference in times between the login
@@ -18,9 +21,29 @@ MSG_USER_NOT_FOUND = "This user does not exist"
 MSG_USER_EXISTS = "The user with this name already exists"
 MSG_IMMATURE_SESSION = "This session is too new, and cannot remove others"
 MSG_SIGNUP_FORBIDDEN = "Signup is disabled on this server"
+MSG_SERVER_BUSY = "The server is busy, try again later"
 
 MSG_TASK_NOT_FOUND = "This task does not exist"
 MSG_TEXT_NOT_SPECIFIED = "No text specified"
 MSG_TASK_DANGEROUS = "Potentially dangerous operation"
+MSG_INVALID_LIMIT = "'limit' needs to be a positive integer"
+MSG_INVALID_CURSOR = "Invalid pagination cursor"
+MSG_INVALID_SORT = "Unsupported sort order"
+MSG_INVALID_FIELDS = "Unknown task field requested"
+MSG_SEARCH_CURSOR = "Search results cannot be paginated with a cursor"
+MSG_INVALID_SINCE = "'since' needs to be a timestamp"
+MSG_INVALID_DEPTH = "'depth' needs to be a non-negative integer"
+MSG_INVALID_STATUS = "'status' needs to be a non-negative integer"
+MSG_INVALID_FILTER = "Task filters need to be non-negative integers"
+MSG_FILTERED_DELTA = "Task changes cannot be filtered"
+MSG_INVALID_BATCH = "Batch operations need to be a list of valid operations"
+MSG_UNKNOWN_REF = "Unknown temporary task ID"
+MSG_DUPLICATE_REF = "Temporary task IDs need to be unique"
+MSG_SINCE_EXPIRED = "Changes this old are no longer tracked, fetch the full task list"
+
+MAX_PAGE_SIZE = 1000  # max number of tasks returned in a single page
+STREAM_BATCH_SIZE = 500  # number of rows fetched and sent at once in streamed responses
+MAX_BATCH_SIZE = 500  # max number of operations in a single batch request
+MSG_BATCH_TOO_LARGE = f"A batch can contain up to {MAX_BATCH_SIZE} operations"
 
 VERSION = "0.0.5"
@@ -1,17 +1,20 @@
 from hashlib import sha256
 from base64 import b64encode
-from typing import List
+from typing import Iterable
 
 from bcrypt import hashpw, gensalt, checkpw
 
-from project_amber.const import MSG_USER_EXISTS
-from project_amber.db import db
+from project_amber.cache import token_cache
+from project_amber.config import config
+from project_amber.const import MSG_USER_EXISTS, STREAM_BATCH_SIZE
+from project_amber.db import db, replica_read
 from project_amber.helpers import time
 from project_amber.handlers import LoginUser
 from project_amber.handlers.const import API_PASSWORD
-from project_amber.errors import Unauthorized, NotFound, Conflict
-from project_amber.logging import error
+from project_amber.errors import Unauthorized, NotFound, Conflict, ServiceUnavailable
+from project_amber.logging import error, log
 from project_amber.models.auth import User, Session
+from project_amber.pool import password_pool
 
 
 def prehash(password: str) -> bytes:
@@ -22,11 +25,56 @@ def prehash(password: str) -> bytes:
     return b64encode(sha256(password.encode()).digest())
 
 
-def gen_hashed_pw(password: str) -> bytes:
+def gen_hashed_pw(password: str) -> str:
     """
-    Returns a bcrypt password hash with random salt.
+    Returns a bcrypt password hash with random salt and `bcrypt_rounds` cost.
+    The hash is computed in the password worker pool.
     """
-    return hashpw(prehash(password), gensalt()).decode()
+    salt = gensalt(rounds=config.bcrypt_rounds)
+    return password_pool.run(hashpw, prehash(password), salt).decode()
+
+
+def hash_rounds(hashed_pw: bytes) -> int:
+    """
+    Returns the cost factor of a bcrypt hash (`$2b$<cost>$...`), or 0 if the
+    hash is malformed.
+    """
+    try:
+        return int(hashed_pw.split(b"$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def check_pw(user: User, password: str) -> bool:
+    """
+    Checks a password against the hash of an already loaded user in the
+    password worker pool.
+    """
+    user_pass = user.password
+    if isinstance(user_pass, str):
+        user_pass = user_pass.encode()
+    return password_pool.run(checkpw, prehash(password), user_pass)
+
+
+def rehash_pw(user: User, password: str):
+    """
+    Rehashes the user's password if it was hashed with a cost other than
+    `bcrypt_rounds`. Must only be called with a verified password; the
+    change is committed by the caller.
+    """
+    user_pass = user.password
+    if isinstance(user_pass, str):
+        user_pass = user_pass.encode()
+    rounds = hash_rounds(user_pass)
+    if rounds == config.bcrypt_rounds:
+        return
+    try:
+        user.password = gen_hashed_pw(password)
+    except ServiceUnavailable:
+        # the login itself has succeeded, rehash on a less busy login
+        return
+    log(f"Rehashed the password of user {user.id} from cost {rounds} "
+        f"to {config.bcrypt_rounds}")
 
 
 def gen_token() -> str:
@@ -71,34 +119,36 @@ class UserController:
         Removes a user from the database. Returns their ID.
         """
         user = db.session.query(User).filter_by(id=self.user.id).one_or_none()
+        tokens = [s.token for s in db.session.query(Session.token).filter_by(user=self.user.id)]
         try:
             db.session.delete(user)
             db.session.commit()
         # pylint: disable=bare-except
         except:
             error("Failed to remove user %s!" % user.name)
+        token_cache.evict(*tokens)
         return self.user.id
 
     def verify_pw(self, uid: int, password: str) -> bool:
         """
-        Verifies user's password with bcrypt's checkpw(). Returns `True`, if
-        the passwords match, and False otherwise.
+        Verifies user's password with bcrypt's checkpw() in the password
+        worker pool. Returns `True`, if the passwords match, and False
+        otherwise.
         """
         user = db.session.query(User).filter_by(id=uid).one()
-        user_pass = user.password
-        if isinstance(user_pass, str):
-            user_pass = user_pass.encode()
-        return checkpw(prehash(password), user_pass)
+        return check_pw(user, password)
 
     def create_session(self, name: str, password: str, ip_addr: str) -> str:
         """
-        Creates a new user session. Returns an auth token.
+        Creates a new user session. Returns an auth token. Passwords hashed
+        with an outdated cost are rehashed along the way.
         """
         user = db.session.query(User).filter_by(name=name).one_or_none()
         token: str
         if user is None:
             raise Unauthorized
-        if self.verify_pw(user.id, password):
+        if check_pw(user, password):
+            rehash_pw(user, password)
             token = gen_token()
             session = Session(token=token, user=user.id, login_time=time(), address=ip_addr)
             db.session.add(session)
@@ -118,6 +168,7 @@ class UserController:
             raise NotFound
         db.session.delete(session)
         db.session.commit()
+        token_cache.evict(self.user.token)
         return self.user.token
 
     def remove_session_by_id(self, sid: int) -> int:
@@ -127,16 +178,24 @@ class UserController:
         session = db.session.query(Session).filter_by(id=sid, user=self.user.id).one_or_none()
         if session is None:
             raise NotFound
+        token = session.token
         db.session.delete(session)
         db.session.commit()
+        token_cache.evict(token)
         return sid
 
-    def get_sessions(self) -> List[Session]:
+    @replica_read
+    def get_sessions(self, stream: bool = False) -> Iterable[Session]:
         """
-        Returns a list of sessions of a user (class `Session`).
+        Returns a list of sessions of a user (class `Session`). With `stream`
+        set, returns an iterator that fetches them from the database in
+        batches instead.
         """
-        sessions = db.session.query(Session).filter_by(user=self.user.id).all()
-        return sessions
+        req = db.session.query(Session).filter_by(user=self.user.id)
+        if stream:
+            # run the query right away for it to go to the replica
+            return iter(req.yield_per(STREAM_BATCH_SIZE))
+        return req.all()
 
     def get_session(self, sid: int) -> Session:
         """
@@ -1,12 +1,144 @@
-from typing import List, Optional, cast
+from collections import defaultdict
+from operator import eq, ge, le
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, cast
+
+from sqlalchemy import select, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
 
 from project_amber.const import MSG_TASK_NOT_FOUND, MSG_TASK_DANGEROUS, \
-    MSG_TEXT_NOT_SPECIFIED
-from project_amber.db import db
+    MSG_TEXT_NOT_SPECIFIED, MSG_INVALID_CURSOR, MSG_INVALID_SORT, MSG_INVALID_FIELDS, \
+    MSG_INVALID_LIMIT, MSG_SEARCH_CURSOR, MAX_PAGE_SIZE, STREAM_BATCH_SIZE, MSG_INVALID_BATCH, \
+    MSG_BATCH_TOO_LARGE, MSG_UNKNOWN_REF, MAX_BATCH_SIZE, MSG_FILTERED_DELTA, MSG_DUPLICATE_REF, \
+    MSG_SINCE_EXPIRED, DAY_SECONDS
+from project_amber.config import config
+from project_amber.db import db, replica_read
 from project_amber.errors import NotFound, BadRequest
 from project_amber.handlers import LoginUser
-from project_amber.helpers import time
-from project_amber.models.task import Task
+from project_amber.handlers.const import API_ID, API_LASTMOD, API_PID, API_OP, API_REF, \
+    API_TASK, API_OP_CREATE, API_OP_UPDATE, API_OP_DELETE, API_STATUS, API_DEADLINE, \
+    API_REMINDER, API_DUE_AFTER, API_DUE_BEFORE, API_REMIND_AFTER, API_REMIND_BEFORE
+from project_amber.helpers import time, encode_cursor, decode_cursor
+from project_amber.models.task import Task, TaskTree, TaskTombstone, TaskVersion, \
+    PUBLIC_FIELDS, OPTIONAL_FIELDS, task_record
+from project_amber.search import get_search_backend
+
+DELETE_BATCH_SIZE = 500  # max number of task IDs in a single DELETE statement
+# fields task lists can be ordered by
+SORT_FIELDS = (API_ID, API_LASTMOD, API_DEADLINE, API_REMINDER)
+# task list filters, API name -> (`Task` attribute, comparison)
+FILTERS = {
+    API_STATUS: ("status", eq),
+    API_PID: ("parent_id", eq),
+    API_DUE_AFTER: ("deadline", ge),
+    API_DUE_BEFORE: ("deadline", le),
+    API_REMIND_AFTER: ("reminder", ge),
+    API_REMIND_BEFORE: ("reminder", le)
+}
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """
+    Parses a comma-separated list of public task fields (API names) to load.
+    Returns all of the public fields if the list is empty or `None`. The task
+    ID is always included.
+    """
+    if not fields:
+        return list(PUBLIC_FIELDS)
+    result = [API_ID]
+    for field in fields.split(","):
+        if not field in PUBLIC_FIELDS:
+            raise BadRequest(MSG_INVALID_FIELDS)
+        if not field in result:
+            result.append(field)
+    return result
+
+
+def task_columns(attrs: Iterable[str]) -> list:
+    """
+    Returns the `Task` columns for a list of attribute names.
+    """
+    return [getattr(Task, attr) for attr in attrs]
+
+
+def yield_records(result, make_record: Callable) -> Iterator:
+    """
+    Yields the rows of a query result as records, fetching them from the
+    database in batches of `STREAM_BATCH_SIZE` rows.
+    """
+    while True:
+        rows = result.fetchmany(STREAM_BATCH_SIZE)
+        if not rows:
+            return
+        for row in rows:
+            yield make_record(row)
+
+
+def fetch_records(statement, attrs: List[str]) -> List:
+    """
+    Runs a core `select()` of the `Task` attributes `attrs`, skipping the ORM
+    (no identity map, no change tracking). Returns the rows as records of
+    `task_record(attrs)`.
+    """
+    make_record = task_record(tuple(attrs))
+    return [make_record(row) for row in db.session.execute(statement)]
+
+
+def stream_records(statement, attrs: List[str]) -> Iterator:
+    """
+    Same as `fetch_records()`, but returns an iterator that fetches the
+    records in batches. The statement runs right away, so that it goes to
+    the database the calling method is routed to.
+    """
+    result = db.session.execute(statement.execution_options(stream_results=True))
+    return yield_records(result, task_record(tuple(attrs)))
+
+
+def filter_tasks(req, filters: Dict[str, int]):
+    """
+    Narrows down a `select()` of `Task` columns to the tasks matching all of
+    the `filters` (API names of `FILTERS` -> values). Parent ID 0 stands for
+    the top level tasks.
+    """
+    for name, value in filters.items():
+        attr, compare = FILTERS[name]
+        column = getattr(Task, attr)
+        if attr == "parent_id" and not value:
+            req = req.where(or_(column.is_(None), column == 0))
+        else:
+            req = req.where(compare(column, value))
+    return req
+
+
+def is_task_ref(value) -> bool:
+    """
+    Checks whether a value of a batch operation can refer to a task: a task
+    ID or a temporary ID of a created task. JSON booleans are not task IDs,
+    even though Python treats them as integers.
+    """
+    return isinstance(value, (int, str)) and not isinstance(value, bool)
+
+
+def retention_start() -> int:
+    """
+    Returns the time the deletion log goes back to: removals before it may
+    have been pruned with `prune_tombstones()`. Zero if nothing is pruned.
+    """
+    if config.tombstone_retention_days <= 0:
+        return 0
+    return time() - config.tombstone_retention_days * DAY_SECONDS
+
+
+def prune_tombstones() -> int:
+    """
+    Removes the deletion log entries older than `tombstone_retention_days`.
+    Returns the number of entries removed.
+    """
+    before = retention_start()
+    removed = db.session.query(TaskTombstone).filter(TaskTombstone.deletion_time < before) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return removed
 
 
 class TaskController:
@@ -15,13 +147,21 @@ class TaskController:
     def __init__(self, user: LoginUser):
         self.user = user
 
-    def add_task(self, data: dict) -> int:
+    def new_task(self, data: dict) -> Task:
         """
-        Creates a new task. Returns its ID.
+        Builds a new task from the request data. Does not add it to the
+        database.
         """
         task = Task(self.user.id, data)
         if task.text is None: raise BadRequest(MSG_TEXT_NOT_SPECIFIED)
         if task.status is None: task.status = 0
+        return task
+
+    def add_task(self, data: dict) -> int:
+        """
+        Creates a new task. Returns its ID.
+        """
+        task = self.new_task(data)
         parent_id = task.parent_id
         if parent_id:
             parent = db.session.query(Task).filter_by(id=parent_id,
@@ -29,13 +169,60 @@ class TaskController:
             if parent is None:
                 raise NotFound(MSG_TASK_NOT_FOUND)
         task.add()
-        db.session.commit()
-        self.update_children(task.id)
-        # TODO: can we remove the second commit here?
+        db.session.flush()
+        self.forget_removals([task.id])
+        db.session.add(TaskTree(ancestor=task.id, descendant=task.id, depth=0))
+        if parent_id:
+            self.link_subtree(task.id, parent_id)
+        self.bump_version()
         db.session.commit()
         return task.id
 
-    def get_task(self, task_id: int) -> Task:
+    @replica_read
+    def get_version(self) -> int:
+        """
+        Returns the version of the task list of the user, a number that
+        changes every time any of their tasks change. Read from the same
+        replica as the tasks, so that a version never gets ahead of the tasks
+        returned along with it.
+        """
+        version = db.session.query(TaskVersion.version) \
+            .filter_by(owner=self.user.id).scalar()
+        return version or 0
+
+    def bump_version(self):
+        """
+        Increments the version of the task list of the user. To be called in
+        every transaction that changes their tasks. Does not commit.
+        """
+        query = db.session.query(TaskVersion).filter_by(owner=self.user.id)
+        increment = {TaskVersion.version: TaskVersion.version + 1}
+        if query.update(increment, synchronize_session=False):
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(TaskVersion(owner=self.user.id, version=1))
+        except IntegrityError:
+            # a concurrent first write of the user has created the row
+            query.update(increment, synchronize_session=False)
+
+    @replica_read
+    def get_task(self, task_id: int):
+        """
+        Returns the public details of a task as a record of the attributes of
+        `PUBLIC_FIELDS` (see `task_record()`), given the ID. Reads from a
+        replica if there is one, use `load_task()` for tasks about to be
+        changed.
+        """
+        attrs = list(PUBLIC_FIELDS.values())
+        statement = select(task_columns(attrs)) \
+            .where(and_(Task.id == task_id, Task.owner == self.user.id))
+        records = fetch_records(statement, attrs)
+        if not records:
+            raise NotFound(MSG_TASK_NOT_FOUND)
+        return records[0]
+
+    def load_task(self, task_id: int) -> Task:
         """
         Returns an instance of `Task`, given the ID.
         """
@@ -44,67 +231,443 @@ class TaskController:
             raise NotFound(MSG_TASK_NOT_FOUND)
         return task
 
-    def get_tasks(self, text: str = None) -> List[Task]:
+    @replica_read
+    def get_tasks(
+        self,
+        text: Optional[str] = None,
+        *,
+        fields: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+        sort: str = API_ID,
+        stream: bool = False,
+        since: Optional[int] = None,
+        filters: Optional[Dict[str, int]] = None
+    ) -> Tuple[Iterable, Optional[str]]:
         """
-        Returns a list containing tasks from a certain user. If the second
-        parameter is specified, this will return the tasks that have this text
-        in their description (`text in Task.text`).
+        Returns a page of tasks from a certain user, and the pagination
+        cursor of the next page (`None` if there are no more tasks). Tasks are
+        returned as records (see `task_record()`) holding the `Task`
+        attributes of the requested public `fields` (API names, all of them by
+        default, see `parse_fields()`).
+
+        Tasks are ordered by `sort` (one of `SORT_FIELDS`); ordering by
+        `deadline` or `reminder` leaves out the tasks without one. Only the
+        tasks matching all of the `filters` are returned (see
+        `filter_tasks()`). Up to `limit` tasks are returned, starting after
+        the task the `after` cursor points to. If `text` is specified, this
+        will return the tasks that match this text, best matches first (see
+        `project_amber.search`); search results can be limited, but cannot be
+        paginated with a cursor.
+
+        With `stream` set and no `limit`, the tasks are returned as an iterator
+        that fetches them from the database in batches instead of a list.
+
+        If `since` is specified, only the tasks modified at or after this time
+        are returned (see also `get_deleted()`); these cannot be filtered, as
+        clients would not learn about tasks that no longer match the filters.
         """
-        req = db.session.query(Task).filter_by(owner=self.user.id)
-        if text is None:
-            return req.all()
-        return req.filter(Task.text.ilike("%{0}%".format(text))).all()
+        if fields is None:
+            fields = list(PUBLIC_FIELDS)
+        if not sort in SORT_FIELDS:
+            raise BadRequest(MSG_INVALID_SORT)
+        if limit is not None:
+            if limit < 1:
+                raise BadRequest(MSG_INVALID_LIMIT)
+            limit = min(limit, MAX_PAGE_SIZE)
+        sort_attr = PUBLIC_FIELDS[sort]
+        attrs = [PUBLIC_FIELDS[field] for field in fields]
+        # the cursor needs the ID and the sort key of the last task
+        for attr in ("id", sort_attr):
+            if not attr in attrs:
+                attrs.append(attr)
+        req = select(task_columns(attrs)).where(Task.owner == self.user.id)
+        if since is not None:
+            if filters:
+                raise BadRequest(MSG_FILTERED_DELTA)
+            # `0` asks for every task, which needs no deletion log
+            if 0 < since < retention_start():
+                raise BadRequest(MSG_SINCE_EXPIRED)
+            req = req.where(Task.last_mod_time >= since)
+        if filters:
+            req = filter_tasks(req, filters)
+        if text is not None:
+            if after is not None:
+                raise BadRequest(MSG_SEARCH_CURSOR)
+            req = get_search_backend().search(req, text).limit(limit)
+            if stream and limit is None:
+                return stream_records(req, attrs), None
+            return fetch_records(req, attrs), None
+        sort_column = getattr(Task, sort_attr)
+        if sort in OPTIONAL_FIELDS:
+            req = req.where(sort_column.isnot(None))
+        if after is not None:
+            try:
+                sort_value, last_id = decode_cursor(after)
+                if not isinstance(sort_value, int) or not isinstance(last_id, int):
+                    raise ValueError(after)
+            except ValueError:
+                raise BadRequest(MSG_INVALID_CURSOR) from None
+            if sort_attr == "id":
+                req = req.where(Task.id > last_id)
+            else:
+                req = req.where(
+                    or_(
+                        sort_column > sort_value,
+                        and_(sort_column == sort_value, Task.id > last_id)
+                    )
+                )
+        if sort_attr == "id":
+            req = req.order_by(Task.id)
+        else:
+            req = req.order_by(sort_column, Task.id)
+        if limit is None:
+            if stream:
+                return stream_records(req, attrs), None
+            return fetch_records(req, attrs), None
+        rows = fetch_records(req.limit(limit + 1), attrs)
+        if len(rows) <= limit:
+            return rows, None
+        last = rows[limit - 1]
+        return rows[:limit], encode_cursor([getattr(last, sort_attr), last.id])
 
-    def update_children(self, task_id: int):
+    @replica_read
+    def get_subtree(
+        self,
+        task_id: int,
+        fields: Optional[List[str]] = None,
+        max_depth: Optional[int] = None,
+        status: Optional[int] = None
+    ) -> List:
         """
-        Recursively updates children lists for the children nodes of
-        a task subtree.
+        Returns a task and its descendants with a single closure table query,
+        as records (see `task_record()`) holding the `Task` attributes of the
+        requested public `fields` (API names, all of them by default), the
+        task ID and the parent ID, followed by `depth`, the number of tree
+        levels between the task and the requested one. Parents go before
+        their children.
+
+        Only the tasks up to `max_depth` levels below the requested one are
+        returned if it is specified, and only the descendants with a certain
+        `status` if that is specified.
         """
-        task = self.get_task(task_id)
-        if task.parent_id:
-            parent = self.get_task(task.parent_id)
-            parent_list = parent.get_parents()
-            parent_list.append(parent.id)
-            task.set_parents(parent_list)
-        else:
-            task.set_parents(list())
-        children = db.session.query(Task).filter_by(parent_id=task_id).all()
-        for child in children:
-            self.update_children(child.id)
+        if fields is None:
+            fields = list(PUBLIC_FIELDS)
+        attrs = [PUBLIC_FIELDS[field] for field in fields]
+        # nesting the tasks needs their IDs and parent IDs
+        for attr in ("id", "parent_id"):
+            if not attr in attrs:
+                attrs.append(attr)
+        req = select(task_columns(attrs) + [TaskTree.depth]) \
+            .select_from(TaskTree.__table__.join(Task, Task.id == TaskTree.descendant)) \
+            .where(and_(TaskTree.ancestor == task_id, Task.owner == self.user.id))
+        if max_depth is not None:
+            req = req.where(TaskTree.depth <= max_depth)
+        if status is not None:
+            req = req.where(or_(TaskTree.depth == 0, Task.status == status))
+        records = fetch_records(req.order_by(TaskTree.depth, Task.id), attrs + ["depth"])
+        if not records:
+            raise NotFound(MSG_TASK_NOT_FOUND)
+        return records
+
+    @replica_read
+    def get_deleted(self, since: int) -> List[int]:
+        """
+        Returns the IDs of the tasks of a user removed at or after a certain
+        time.
+        """
+        return [
+            row.task_id for row in db.session.query(TaskTombstone.task_id).filter(
+                TaskTombstone.owner == self.user.id, TaskTombstone.deletion_time >= since
+            ).order_by(TaskTombstone.id)
+        ]
+
+    def forget_removals(self, task_ids: Iterable[int]):
+        """
+        Drops the deletion log entries of task IDs taken by new tasks. SQLite
+        hands out the ID of the last removed task again, and a task must not
+        be reported as both changed and removed. Does not commit.
+        """
+        db.session.query(TaskTombstone).filter(
+            TaskTombstone.owner == self.user.id, TaskTombstone.task_id.in_(task_ids)
+        ).delete(synchronize_session=False)
+
+    def is_ancestor(self, ancestor_id: int, task_id: int) -> bool:
+        """
+        Checks whether a task is an ancestor of another task (or the task
+        itself) with a single primary key lookup in the closure table.
+        """
+        link = db.session.query(TaskTree.depth) \
+            .filter_by(ancestor=ancestor_id, descendant=task_id).first()
+        return link is not None
+
+    def subtree_query(self, task_id: int):
+        """
+        Returns a query selecting the IDs (`descendant`) of all of the tasks in
+        a subtree, including its root. Uses an alias of the closure table, so
+        it can be embedded into statements on `TaskTree` itself.
+        """
+        links = aliased(TaskTree)
+        return db.session.query(links.descendant).filter(links.ancestor == task_id)
+
+    def link_subtree(self, task_id: int, parent_id: int):
+        """
+        Links every task of a subtree to every ancestor of a new parent task
+        with a single INSERT ... SELECT statement. Does not commit.
+        """
+        ancestors = aliased(TaskTree)
+        subtree = aliased(TaskTree)
+        links = select([
+            ancestors.ancestor, subtree.descendant, ancestors.depth + subtree.depth + 1
+        ]).where(ancestors.descendant == parent_id).where(subtree.ancestor == task_id)
+        db.session.flush()  # `execute()` does not flush pending links on its own
+        db.session.execute(
+            TaskTree.__table__.insert().from_select(["ancestor", "descendant", "depth"], links)
+        )
+
+    def move_subtree(self, task: Task, parent: Optional[Task]):
+        """
+        Moves a task under a new parent (or to the top level, if `parent` is
+        `None`). The closure table links between the subtree and its old
+        ancestors are removed with one DELETE statement, the links to the new
+        ancestors are added with one INSERT. Does not commit.
+        """
+        new_parent_id = None if parent is None else parent.id
+        if task.parent_id == new_parent_id:
+            return
+        task.parent_id = new_parent_id
+        subtree = self.subtree_query(task.id)
+        db.session.query(TaskTree).filter(
+            TaskTree.descendant.in_(subtree), TaskTree.ancestor.notin_(subtree)
+        ).delete(synchronize_session=False)
+        if parent is not None:
+            self.link_subtree(task.id, parent.id)
 
     def update_task(self, task_id: int, data: dict) -> int:
         """
         Updates the task details. Returns its ID.
         """
-        task = self.get_task(task_id)
+        task = self.load_task(task_id)
+        self.apply_update(task, data, self.load_task)
+        self.bump_version()
+        db.session.commit()
+        return task_id
+
+    def apply_update(self, task: Task, data: dict, find_task: Callable[[Any], Task]):
+        """
+        Applies new details from the request data to a task. `find_task` is
+        used to look up the new parent task by its ID. Does not commit.
+        """
         new_details = Task(self.user.id, data)
+        # the parent is changed by `move_subtree()` only
+        new_details.parent_id, new_parent_id = None, new_details.parent_id
         task.merge(new_details)
-        if not new_details.parent_id is None:
-            if new_details.parent_id == 0:
+        if not new_parent_id is None:
+            if new_parent_id == 0:
                 # promote task to the top level
-                task.parent_id = None
-                self.update_children(task.id)
+                self.move_subtree(task, None)
             else:
-                new_parent = self.get_task(new_details.parent_id)
-                if task.id in new_parent.get_parents() or task.id == new_parent.id:
+                new_parent = find_task(new_parent_id)
+                if self.is_ancestor(task.id, new_parent.id):
                     raise BadRequest(MSG_TASK_DANGEROUS)
-                task.parent_id = new_parent.id
-                self.update_children(task.id)
+                self.move_subtree(task, new_parent)
         task.last_mod_time = time()
-        db.session.commit()
-        return task_id
 
     def remove_task(self, task_id: int) -> List[int]:
         """
-        Removes a task, recursively removing its subtasks. Returns the list of
-        removed task IDs.
+        Removes a task together with its subtasks in a single transaction,
+        recording their IDs in the deletion log. Returns the list of removed
+        task IDs, subtasks going before their parents.
         """
-        removed = list()
-        children = db.session.query(Task).filter_by(parent_id=task_id).all()
-        for child in children:
-            removed.extend(self.remove_task(child.id))
-        task = self.get_task(task_id)
-        task.delete()
+        task = self.load_task(task_id)
+        removed = self.apply_removal(task)
+        self.bump_version()
         db.session.commit()
-        removed.append(task.id)
         return removed
+
+    def apply_removal(self, task: Task) -> List[int]:
+        """
+        Removes a task together with its subtasks, recording their IDs in the
+        deletion log. Returns the list of removed task IDs, subtasks going
+        before their parents. Does not commit.
+        """
+        # the deepest tasks go first, the task itself with depth 0 goes last
+        removed = [
+            row.descendant for row in db.session.query(TaskTree.descendant)
+            .filter(TaskTree.ancestor == task.id).order_by(TaskTree.depth.desc())
+        ]
+        db.session.query(TaskTree).filter(TaskTree.descendant.in_(self.subtree_query(task.id))) \
+            .delete(synchronize_session=False)
+        for i in range(0, len(removed), DELETE_BATCH_SIZE):
+            batch = removed[i:i + DELETE_BATCH_SIZE]
+            db.session.query(Task).filter(Task.id.in_(batch)).delete(synchronize_session=False)
+        deletion_time = time()
+        db.session.bulk_insert_mappings(
+            TaskTombstone, [{
+                "task_id": removed_id,
+                "owner": self.user.id,
+                "deletion_time": deletion_time
+            } for removed_id in removed]
+        )
+        return removed
+
+    def apply_batch(self, operations: list) -> Tuple[Dict[str, int], List[int]]:
+        """
+        Applies a list of task operations in a single transaction. Every
+        operation is a dict like one of these:
+        ```
+        {"op": "create", "ref": "new-1", "task": {"text": "Some task", ...}}
+        {"op": "update", "id": 123, "task": {"status": 1, ...}}
+        {"op": "delete", "id": 124}
+        ```
+        `ref` is an optional temporary ID of a created task. Created tasks can
+        be referred to by it instead of their real ID in the `id` and
+        `parent_id` fields of the operations that follow. The existing tasks
+        the operations refer to are loaded (and their ownership checked) in
+        bulk, consecutive creations are inserted in bulk. Returns the mapping
+        of temporary IDs to real task IDs, and the list of removed task IDs.
+        """
+        if not isinstance(operations, list):
+            raise BadRequest(MSG_INVALID_BATCH)
+        if len(operations) > MAX_BATCH_SIZE:
+            raise BadRequest(MSG_BATCH_TOO_LARGE)
+        new_refs = set()
+        for operation in operations:
+            if not isinstance(operation, dict):
+                raise BadRequest(MSG_INVALID_BATCH)
+            op = operation.get(API_OP)
+            if op in (API_OP_CREATE, API_OP_UPDATE):
+                if not isinstance(operation.get(API_TASK), dict):
+                    raise BadRequest(MSG_INVALID_BATCH)
+                parent_id = operation[API_TASK].get(API_PID)
+                if parent_id is not None and not is_task_ref(parent_id):
+                    raise BadRequest(MSG_INVALID_BATCH)
+            elif op != API_OP_DELETE:
+                raise BadRequest(MSG_INVALID_BATCH)
+            if op == API_OP_CREATE:
+                ref = operation.get(API_REF, "")
+                if not isinstance(ref, str):
+                    raise BadRequest(MSG_INVALID_BATCH)
+                if ref in new_refs:
+                    raise BadRequest(MSG_DUPLICATE_REF)
+                if ref:
+                    new_refs.add(ref)
+            elif not is_task_ref(operation.get(API_ID)):
+                raise BadRequest(MSG_INVALID_BATCH)
+
+        tasks = self.load_batch_tasks(operations)
+        refs: Dict[str, int] = dict()
+        removed: List[int] = list()
+
+        def find_task(ref) -> Task:
+            if isinstance(ref, str):
+                if not ref in refs:
+                    raise BadRequest(MSG_UNKNOWN_REF)
+                ref = refs[ref]
+            if not ref in tasks:
+                raise NotFound(MSG_TASK_NOT_FOUND)
+            return tasks[ref]
+
+        creations: List[dict] = list()
+        for operation in operations + [dict()]:
+            if operation.get(API_OP) == API_OP_CREATE:
+                creations.append(operation)
+                continue
+            if creations:
+                for task in self.create_batch_tasks(creations, refs, find_task):
+                    tasks[task.id] = task
+                creations = list()
+            if operation.get(API_OP) == API_OP_UPDATE:
+                self.apply_update(find_task(operation[API_ID]), operation[API_TASK], find_task)
+            elif operation.get(API_OP) == API_OP_DELETE:
+                for task_id in self.apply_removal(find_task(operation[API_ID])):
+                    tasks.pop(task_id, None)
+                    removed.append(task_id)
+        if operations:
+            self.bump_version()
+        db.session.commit()
+        return refs, removed
+
+    def load_batch_tasks(self, operations: list) -> Dict[int, Task]:
+        """
+        Loads the existing tasks of the user referred to by the real IDs in
+        a list of batch operations with as few queries as possible. Raises
+        `NotFound` if any of them does not exist. Returns a dict of tasks by
+        their IDs.
+        """
+        task_ids = set()
+        for operation in operations:
+            task_id = operation.get(API_ID)
+            parent_id = None
+            if operation.get(API_OP) in (API_OP_CREATE, API_OP_UPDATE):
+                parent_id = operation[API_TASK].get(API_PID)
+            for ref in (task_id, parent_id):
+                if isinstance(ref, int) and ref:
+                    task_ids.add(ref)
+        task_ids_list = list(task_ids)
+        tasks = dict()
+        for i in range(0, len(task_ids_list), DELETE_BATCH_SIZE):
+            batch = task_ids_list[i:i + DELETE_BATCH_SIZE]
+            for task in db.session.query(Task).filter(
+                Task.owner == self.user.id, Task.id.in_(batch)
+            ):
+                tasks[task.id] = task
+        if len(tasks) != len(task_ids):
+            raise NotFound(MSG_TASK_NOT_FOUND)
+        return tasks
+
+    def create_batch_tasks(
+        self, operations: List[dict], refs: Dict[str, int], find_task: Callable[[Any], Task]
+    ) -> List[Task]:
+        """
+        Inserts the tasks of a list of batch creations. The closure table
+        links of all of the new tasks are computed from the ancestors of their
+        parents and inserted with a single statement. Adds the temporary IDs
+        of the new tasks to `refs`. Does not commit. Returns the new tasks.
+        """
+        new_tasks = list()
+        # tasks with a parent created in the same run, to be resolved once
+        # the parent gets its ID
+        pending = list()
+        new_refs = set()
+        for operation in operations:
+            task = self.new_task(operation[API_TASK])
+            parent_id = task.parent_id
+            if isinstance(parent_id, str) and parent_id in new_refs:
+                task.parent_id = None
+                pending.append((task, parent_id))
+            elif parent_id:
+                task.parent_id = find_task(parent_id).id
+            ref = operation.get(API_REF)
+            if ref:
+                new_refs.add(ref)
+            new_tasks.append(task)
+        db.session.add_all(new_tasks)
+        db.session.flush()
+        for task, operation in zip(new_tasks, operations):
+            ref = operation.get(API_REF)
+            if ref:
+                refs[ref] = task.id
+        for task, parent_ref in pending:
+            task.parent_id = refs[parent_ref]
+        new_ids = {task.id for task in new_tasks}
+        self.forget_removals(new_ids)
+        ancestors = defaultdict(list)
+        parent_ids = {task.parent_id for task in new_tasks if task.parent_id} - new_ids
+        for link in db.session.query(TaskTree).filter(TaskTree.descendant.in_(parent_ids)):
+            ancestors[link.descendant].append((link.ancestor, link.depth))
+        links: List[dict] = list()
+        # parents go before their children
+        for task in new_tasks:
+            ancestors[task.id].append((task.id, 0))
+            if task.parent_id:
+                ancestors[task.id].extend(
+                    (ancestor, depth + 1) for ancestor, depth in ancestors[task.parent_id]
+                )
+            links.extend({
+                "ancestor": ancestor,
+                "descendant": task.id,
+                "depth": depth
+            } for ancestor, depth in ancestors[task.id])
+        db.session.bulk_insert_mappings(TaskTree, links)
+        return new_tasks
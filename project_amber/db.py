@@ -1,3 +1,97 @@
-from flask_sqlalchemy import SQLAlchemy
+from functools import wraps
+from random import choice
+from typing import Any, Callable, Dict, List, Optional
 
-db = SQLAlchemy()
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND_PREFIX = "replica"
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session that runs the queries of `replica_read` methods on a read replica
+    (picked once per session), and everything else on the primary database.
+    Once the session has written anything, it sticks to the primary, so that
+    reads always see the writes made before them.
+    """
+    def __init__(self, *args, **options):
+        self.use_replica = False
+        self.has_written = False
+        self.replica_key: Optional[str] = None
+        super().__init__(*args, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.has_written = True
+        elif self.use_replica and not self.has_written:
+            if self.replica_key is None:
+                keys = replica_keys(self.app.config.get("SQLALCHEMY_BINDS"))
+                if not keys:
+                    return super().get_bind(mapper, clause)
+                self.replica_key = choice(keys)
+            return get_state(self.app).db.get_engine(self.app, bind=self.replica_key)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy extension using `RoutingSession`.
+    """
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+# typed as `Any` like the plain `SQLAlchemy()`, so that `db.Model` works as a base class
+db: Any = RoutingSQLAlchemy()
+
+
+def replica_read(method: Callable) -> Callable:
+    """
+    Decorator for read-only methods, routes their queries to a read replica if
+    there is one. Queries must run before the method returns, so methods
+    returning iterators have to start the query themselves.
+    """
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        session = db.session()
+        previous, session.use_replica = session.use_replica, True
+        try:
+            return method(*args, **kwargs)
+        finally:
+            session.use_replica = previous
+
+    return wrapper
+
+
+def replica_keys(binds: Optional[Dict[str, str]]) -> List[str]:
+    """
+    Returns the bind keys of the read replicas out of `SQLALCHEMY_BINDS`.
+    """
+    return [key for key in binds or () if key.startswith(REPLICA_BIND_PREFIX)]
+
+
+def replica_binds(urls: List[str]) -> Dict[str, str]:
+    """
+    Returns the `SQLALCHEMY_BINDS` entries for a list of replica URLs.
+    """
+    return {f"{REPLICA_BIND_PREFIX}{i}": url for i, url in enumerate(urls)}
+
+
+def engine_options(pool_size: Optional[int], max_overflow: Optional[int],
+                   recycle: Optional[int], pre_ping: bool) -> dict:
+    """
+    Returns the `SQLALCHEMY_ENGINE_OPTIONS` for the pool settings. Unset
+    settings are left out, so the defaults of the database driver apply.
+    """
+    options = dict()
+    if pool_size is not None:
+        options["pool_size"] = pool_size
+    if max_overflow is not None:
+        options["max_overflow"] = max_overflow
+    if recycle is not None:
+        options["pool_recycle"] = recycle
+    if pre_ping:
+        options["pool_pre_ping"] = True
+    return options
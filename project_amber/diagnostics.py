@@ -0,0 +1,136 @@
+import os
+from collections import Counter
+from cProfile import Profile
+from itertools import count
+from re import compile as compile_re
+from typing import List, Optional, Tuple
+
+from flask import g, has_app_context, request
+
+from project_amber.config import config
+from project_amber.helpers import time
+from project_amber.hooks import subscribe
+from project_amber.logging import warn
+
+MAX_LOGGED_STATEMENTS = 50  # statements listed in a slow request report
+# placeholders of the DB-API parameter styles: ?, :name, %s, %(name)s, $1
+PLACEHOLDER = compile_re(r"\?|:\w+|%s|%\(\w+\)s|\$\d+")
+PLACEHOLDER_LIST = compile_re(r"\(\?(?:\s*,\s*\?)+\)")
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Returns the "shape" of an SQL statement: whitespace is collapsed, and
+    lists of parameters (like the ones `IN` expands to) are shortened, so
+    that statements differing only in their parameters compare equal.
+    """
+    statement = " ".join(statement.split())
+    return PLACEHOLDER_LIST.sub("(?...)", PLACEHOLDER.sub("?", statement))
+
+
+class RequestTrace:
+    """
+    Holds the SQL statements a request has issued, with their durations,
+    and the profiler of the request if it is sampled.
+    """
+    __slots__ = ("statements", "profiler")
+
+    def __init__(self):
+        self.statements: List[Tuple[str, float]] = list()
+        self.profiler: Optional[Profile] = None
+
+
+def current_trace() -> Optional[RequestTrace]:
+    if not has_app_context():
+        return None
+    return g.get("request_trace")
+
+
+def record_statement(statement: str, duration: float):
+    trace = current_trace()
+    if trace is not None:
+        trace.statements.append((statement, duration))
+
+
+_requests = count(1)
+_profiles = count(1)
+
+
+def start_request():
+    trace = RequestTrace()
+    if config.profile_sample_rate > 0 and next(_requests) % config.profile_sample_rate == 0:
+        trace.profiler = Profile()
+        try:
+            trace.profiler.enable()
+        except ValueError:
+            # another profiler is already running in this thread
+            trace.profiler = None
+    g.request_trace = trace
+
+
+def report_repeated_statements(trace: RequestTrace, endpoint: str):
+    """
+    Warns about the statements a request has issued over and over again with
+    different parameters. The number of these usually grows with the number
+    of rows the request handles (the N+1 query problem).
+    """
+    shapes = Counter(normalize_statement(statement) for statement, _ in trace.statements)
+    for shape, times in shapes.most_common():
+        if times < config.repeated_query_threshold:
+            break
+        warn(f"{request.method} {endpoint} ran the same statement {times} times, "
+             f"out of {len(trace.statements)}: {shape}")
+
+
+def report_slow_request(trace: RequestTrace, endpoint: str, duration: float):
+    """
+    Warns about a request taking longer than `slow_request_ms`, listing the
+    statements it has issued.
+    """
+    db_time = sum(spent for _, spent in trace.statements)
+    lines = [
+        f"Slow request {request.method} {endpoint}: {duration * 1000:.1f} ms, "
+        f"{len(trace.statements)} statements in {db_time * 1000:.1f} ms"
+    ]
+    for statement, spent in trace.statements[:MAX_LOGGED_STATEMENTS]:
+        lines.append(f"  {spent * 1000:8.2f} ms  {' '.join(statement.split())}")
+    if len(trace.statements) > MAX_LOGGED_STATEMENTS:
+        lines.append(f"  ... {len(trace.statements) - MAX_LOGGED_STATEMENTS} more")
+    warn("\n".join(lines))
+
+
+def save_profile(profiler: Profile, endpoint: str):
+    """
+    Saves a request profile to `profile_dir` in the `pstats` format.
+    """
+    os.makedirs(config.profile_dir, exist_ok=True)
+    name = f"{time()}-{os.getpid()}-{next(_profiles)}-{endpoint}.prof"
+    profiler.dump_stats(os.path.join(config.profile_dir, name))
+
+
+def finish_request(duration: float):
+    # runs after streamed responses are sent, so they are traced in full
+    trace = g.pop("request_trace", None)
+    if trace is None:
+        return
+    endpoint = request.endpoint or "unknown"
+    if trace.profiler is not None:
+        trace.profiler.disable()
+        save_profile(trace.profiler, endpoint)
+    if config.repeated_query_threshold > 0:
+        report_repeated_statements(trace, endpoint)
+    if 0 < config.slow_request_ms <= duration * 1000:
+        report_slow_request(trace, endpoint, duration)
+
+
+def init_diagnostics(app):
+    """
+    Subscribes the slow request log, the repeated statement detector and
+    request profiling to the request and SQLAlchemy hooks (see
+    `project_amber.hooks`). Nothing is installed unless one of them is
+    enabled.
+    """
+    if config.slow_request_ms <= 0 and config.repeated_query_threshold <= 0 \
+            and config.profile_sample_rate <= 0:
+        return
+    subscribe(app, record_statement, start_request, finish_request)
@@ -0,0 +1,47 @@
+"""
+JSON encoding of the response bodies. Uses the fastest encoder available:
+orjson, then ujson, then the standard library (see the `json_encoder`
+config value). Every encoder produces compact UTF-8 JSON as `bytes`.
+"""
+from json import dumps as json_dumps
+from typing import Any, Callable, Tuple
+
+from project_amber.config import config
+from project_amber.logging import warn
+
+ENCODERS: Tuple[str, ...] = ("orjson", "ujson", "json")  # in the order of preference
+
+
+def make_encoder(name: str) -> Callable[[Any], bytes]:
+    """
+    Returns the encoding function of a JSON library. Raises `ImportError` if
+    the library is not installed.
+    """
+    # pylint: disable=import-outside-toplevel,import-error
+    if name == "orjson":
+        import orjson
+        return orjson.dumps
+    if name == "ujson":
+        import ujson
+        return lambda value: ujson.dumps(value, ensure_ascii=False).encode()
+    return lambda value: json_dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def pick_encoder() -> Callable[[Any], bytes]:
+    """
+    Returns the encoder named by the `json_encoder` config value, or the
+    first installed one of `ENCODERS` if it is `auto` or not installed.
+    """
+    names: Tuple[str, ...] = ENCODERS
+    if config.json_encoder != "auto":
+        names = (config.json_encoder, ) + ENCODERS
+    for name in names:
+        try:
+            return make_encoder(name)
+        except ImportError:
+            if name == config.json_encoder:
+                warn(f"JSON encoder {name} is not installed, falling back to the fastest one")
+    return make_encoder("json")
+
+
+encode: Callable[[Any], bytes] = pick_encoder()
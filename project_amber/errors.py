@@ -1,12 +1,15 @@
+from functools import lru_cache
 from http import HTTPStatus
 
-from project_amber.logging import warn, error
+from project_amber.encoding import encode
 
 
 class HTTPError(Exception):
     """
     Base class for all possible errors.
     """
+    headers: dict = dict()  # extra headers to send with the error response
+
     def __init__(self, code: int, message: str):
         """
         Initialize the error object.
@@ -15,7 +18,6 @@ class HTTPError(Exception):
         """
         self.code = code
         self.message = message
-        warn(self.message)
         super(HTTPError, self).__init__()
 
 
@@ -35,9 +37,8 @@ class InternalServerError(HTTPError):
     """
     code = HTTPStatus.INTERNAL_SERVER_ERROR
 
-    ## pylint: disable=super-init-not-called
     def __init__(self, message="Internal error"):
-        error(message)
+        super().__init__(self.code, message)
 
 
 class NotFound(HTTPError):
@@ -79,3 +80,24 @@ class Conflict(HTTPError):
 
     def __init__(self, message="This entity already exists"):
         super().__init__(self.code, message)
+
+
+class ServiceUnavailable(HTTPError):
+    """
+    Exception class for requests rejected because the server is overloaded.
+    Asks the client to retry in a second.
+    """
+    code = HTTPStatus.SERVICE_UNAVAILABLE
+    headers = {"Retry-After": "1"}
+
+    def __init__(self, message="Service unavailable"):
+        super().__init__(self.code, message)
+
+
+@lru_cache(maxsize=256)
+def error_body(message: str) -> bytes:
+    """
+    Returns the encoded JSON body of an error response. Error messages are
+    mostly constants, so the bodies are cached.
+    """
+    return encode({"message": message})
@@ -1,12 +1,18 @@
 from functools import wraps
+from hashlib import sha1
 from re import fullmatch
+from typing import Any, Callable, Iterable, Optional
 
-from flask import request
+from flask import request, current_app, stream_with_context
 
+from project_amber.cache import token_cache, CachedSession
 from project_amber.db import db
-from project_amber.const import MSG_NO_TOKEN, MSG_INVALID_TOKEN, MSG_USER_NOT_FOUND, \
-    MSG_USER_EXISTS, MSG_INVALID_JSON, AUTH_TOKEN_HEADER, AUTH_TOKEN_SCHEME
-from project_amber.errors import Unauthorized, BadRequest, InternalServerError
+from project_amber.const import MSG_NO_TOKEN, MSG_INVALID_TOKEN, \
+    MSG_USER_EXISTS, MSG_INVALID_JSON, AUTH_TOKEN_HEADER, AUTH_TOKEN_SCHEME, STREAM_BATCH_SIZE, \
+    ETAG_HEADER
+from project_amber.encoding import encode
+from project_amber.errors import Unauthorized, BadRequest
+from project_amber.metrics import timed
 from project_amber.models.auth import User, Session
 
 
@@ -24,6 +30,73 @@ class LoginUser:
         self.remote_addr = remote_addr
 
 
+def request_etag(version: int) -> str:
+    """
+    Builds an entity tag for a GET request of an authenticated user from the
+    version of the data the response depends on. The tag also covers the
+    request path and query string, so that different views of the same data
+    get different tags. Returns the tag, quoted.
+    """
+    digest = sha1(f"{request.user.id}:{request.full_path}".encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+def etag_headers(etag: str) -> dict:
+    """
+    Returns the headers to send with a response carrying an entity tag.
+    Clients have to revalidate it on every request.
+    """
+    return {ETAG_HEADER: etag, "Cache-Control": "private, no-cache"}
+
+
+def is_not_modified(etag: str) -> bool:
+    """
+    Checks whether the client already has the response with this entity tag
+    (sent in `If-None-Match`).
+    """
+    return request.if_none_match.contains(etag.strip('"'))
+
+
+def get_int_arg(name: str, message: str) -> Optional[int]:
+    """
+    Returns the value of a non-negative integer query string parameter, or
+    `None` if the parameter is absent. Raises `BadRequest` with `message` if
+    the value is not a non-negative integer.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise BadRequest(message)
+    return int(value)
+
+
+def stream_json_list(items: Iterable, serialize: Callable[[Any], Any]):
+    """
+    Returns a response that sends a JSON list of serialized items, encoding
+    and sending them in chunks of `STREAM_BATCH_SIZE` items, so that neither
+    the list nor its JSON representation is held in memory as a whole. Keeps
+    the request context (and the DB session) alive until the last chunk is
+    sent.
+    """
+    def generate():
+        separator = b""
+        yield b"["
+        chunk = list()
+        for item in items:
+            with timed("serialize"):
+                chunk.append(encode(serialize(item)))
+            if len(chunk) == STREAM_BATCH_SIZE:
+                yield separator + b",".join(chunk)
+                separator = b","
+                chunk.clear()
+        if chunk:
+            yield separator + b",".join(chunk)
+        yield b"]"
+
+    return current_app.response_class(stream_with_context(generate()))
+
+
 def accepts_json(f):
     """
     Checks whether the request payload contains valid JSON, drops errors
@@ -38,11 +111,26 @@ def accepts_json(f):
     return decorated_json_checker
 
 
+def lookup_token(token: str) -> Optional[CachedSession]:
+    """
+    Resolves an auth token to the session owner details with a single joined
+    query covered by the session token index. Returns `None` if there is no
+    such session.
+    """
+    row = db.session.query(User.name, User.id, Session.login_time) \
+        .join(Session, Session.user == User.id) \
+        .filter(Session.token == token).one_or_none()
+    if row is None:
+        return None
+    return row.name, row.id, row.login_time
+
+
 def login_required(f):
     """
     Login handler. Works with Flask's `request`. Checks the auth token HTTP
     header. Sets `request.user` object containing the user's name and their ID.
-    Raises an exception if the auth token is not valid.
+    Raises an exception if the auth token is not valid. Valid tokens are
+    cached in `token_cache`, so repeated requests skip the database.
     """
     @wraps(f)
     def decorated_login_function(*args, **kwargs):
@@ -55,13 +143,15 @@ def login_required(f):
         if token_data[0] != AUTH_TOKEN_SCHEME:
             raise Unauthorized(MSG_INVALID_TOKEN)
         token = token_data[1]
-        user_s = db.session.query(Session).filter_by(token=token).one_or_none()
-        if user_s is None:
-            raise Unauthorized(MSG_INVALID_TOKEN)
-        user = db.session.query(User).filter_by(id=user_s.user).one_or_none()
-        if user is None:
-            raise InternalServerError(MSG_USER_NOT_FOUND)
-        user_details = LoginUser(user.name, user.id, token, user_s.login_time, request.remote_addr)
+        # pylint only infers the `NullTokenCache`, which always misses
+        cached = token_cache.get(token)  # pylint: disable=assignment-from-none
+        if cached is None:
+            cached = lookup_token(token)
+            if cached is None:
+                raise Unauthorized(MSG_INVALID_TOKEN)
+            token_cache.set(token, cached)
+        name, uid, login_time = cached
+        user_details = LoginUser(name, uid, token, login_time, request.remote_addr)
         request.user = user_details
         return f(*args, **kwargs)
 
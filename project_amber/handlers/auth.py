@@ -1,8 +1,7 @@
-from json import dumps
-
 from flask import request, Blueprint
 
 from project_amber.const import EMPTY_RESP, MSG_MISSING_AUTH_INFO
+from project_amber.encoding import encode
 from project_amber.errors import BadRequest
 from project_amber.handlers import login_required, accepts_json
 from project_amber.handlers.const import API_PASSWORD, API_USER, API_TOKEN
@@ -38,7 +37,7 @@ def login():
     uc = UserController(None)
     token = uc.create_session(username, password, request.remote_addr)
     log(f"User {username} logged in from {request.remote_addr}")
-    return dumps({API_TOKEN: token})
+    return encode({API_TOKEN: token})
 
 
 @auth_handlers.route("/logout", methods=["POST"])
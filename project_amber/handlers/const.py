@@ -14,5 +14,30 @@ API_REMINDER = "reminder"
 API_QUERY = "query"
 API_VERSION = "version"
 API_SIGNUP = "signup"
+API_LIMIT = "limit"
+API_AFTER = "after"
+API_SORT = "sort"
+API_FIELDS = "fields"
+API_STREAM = "stream"
+API_SINCE = "since"
+API_TASKS = "tasks"
+API_DELETED = "deleted"
+API_TIME = "time"
+API_OP = "op"
+API_REF = "ref"
+API_TASK = "task"
+API_IDS = "ids"
+API_DEPTH = "depth"
+API_FLAT = "flat"
+API_CHILDREN = "children"
+API_DUE_AFTER = "due_after"
+API_DUE_BEFORE = "due_before"
+API_REMIND_AFTER = "remind_after"
+API_REMIND_BEFORE = "remind_before"
+API_EVENT = "event"
+
+API_OP_CREATE = "create"
+API_OP_UPDATE = "update"
+API_OP_DELETE = "delete"
 
 API_V0 = "/v0"
@@ -0,0 +1,15 @@
+from flask import Blueprint
+
+from project_amber.metrics import registry
+
+metrics_handlers = Blueprint("metrics_handlers", __name__)
+
+
+@metrics_handlers.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Returns the request metrics of the worker process handling the request
+    in the Prometheus text format. Only registered if the `metrics` config
+    value is set.
+    """
+    return registry.render(), {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
@@ -1,10 +1,12 @@
-from json import dumps
-
 from flask import request, Blueprint
 
+from project_amber.config import string_to_bool
 from project_amber.const import MATURE_SESSION, MSG_IMMATURE_SESSION, EMPTY_RESP
+from project_amber.encoding import encode
 from project_amber.errors import Forbidden
-from project_amber.handlers import login_required
+from project_amber.metrics import timed
+from project_amber.handlers import login_required, stream_json_list
+from project_amber.handlers.const import API_STREAM
 from project_amber.helpers import time
 from project_amber.controllers.auth import UserController
 from project_amber.logging import log
@@ -32,13 +34,18 @@ def get_sessions():
         }
     ]
     ```
+    With `?stream=1`, the list is sent in chunks as the sessions are loaded
+    from the database.
     """
     uc = UserController(request.user)
+    if string_to_bool(request.args.get(API_STREAM, "")):
+        return stream_json_list(uc.get_sessions(stream=True), lambda session: session.to_json())
     sessions = uc.get_sessions()
-    sessionList = list()
-    for session in sessions:
-        sessionList.append(session.to_json())
-    return dumps(sessionList)
+    with timed("serialize"):
+        sessionList = list()
+        for session in sessions:
+            sessionList.append(session.to_json())
+        return encode(sessionList)
 
 
 @session_handlers.route("/session/<session_id>", methods=["GET", "DELETE"])
@@ -62,7 +69,7 @@ def session_by_id(session_id: int):
     uc = UserController(request.user)
     if request.method == "GET":
         session = uc.get_session(session_id)
-        return dumps(session.to_json())
+        return encode(session.to_json())
     if request.method == "DELETE":
         if (time() - uc.user.login_time) < MATURE_SESSION:
             raise Forbidden(MSG_IMMATURE_SESSION)
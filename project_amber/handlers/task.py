@@ -1,15 +1,48 @@
-from json import dumps
+from http import HTTPStatus
+from typing import Any, Callable, Iterable, Optional
 
 from flask import request, Blueprint
 
-from project_amber.const import EMPTY_RESP
-from project_amber.handlers import login_required, accepts_json
-from project_amber.handlers.const import API_QUERY
-from project_amber.controllers.task import TaskController
+from project_amber.config import string_to_bool
+from project_amber.const import EMPTY_RESP, MSG_INVALID_LIMIT, MSG_INVALID_SINCE, \
+    MSG_INVALID_DEPTH, MSG_INVALID_STATUS, MSG_INVALID_FILTER, NEXT_CURSOR_HEADER
+from project_amber.encoding import encode
+from project_amber.handlers import login_required, accepts_json, stream_json_list, get_int_arg, \
+    request_etag, etag_headers, is_not_modified
+from project_amber.handlers.const import API_QUERY, API_FIELDS, API_LIMIT, API_AFTER, \
+    API_SORT, API_ID, API_STREAM, API_SINCE, API_TASKS, API_DELETED, API_TIME, API_IDS, \
+    API_DEPTH, API_STATUS, API_FLAT, API_CHILDREN
+from project_amber.helpers import time
+from project_amber.metrics import timed
+from project_amber.controllers.task import TaskController, parse_fields, FILTERS
+from project_amber.models.task import row_serializer, task_to_dict
 
 task_handlers = Blueprint("task_handlers", __name__)
 
 
+def nest_subtree(records: Iterable, serialize: Callable[[Any], dict]) -> Optional[dict]:
+    """
+    Builds the nested representation of a subtree from the records returned
+    by `TaskController.get_subtree()`, every task holding the list of its
+    children. Relies on parents going before their children. Tasks whose
+    parent has been filtered out are left out. Returns `None` if there are
+    no records.
+    """
+    root = None
+    nodes = dict()
+    for record in records:
+        node = serialize(record)
+        node[API_CHILDREN] = []
+        nodes[record.id] = node
+        if root is None:
+            root = node
+            continue
+        parent = nodes.get(record.parent_id)
+        if parent is not None:
+            parent[API_CHILDREN].append(node)
+    return root
+
+
 @task_handlers.route("/task", methods=["GET", "POST"])
 @accepts_json
 @login_required
@@ -18,6 +51,34 @@ def task_request():
     Handles requests to `/api/task`. Accepts GET and POST.
     The request JSON may contain a `query` parameter in a GET request, in this
     case only the tasks which text contains things from `query` will be sent.
+    GET requests also accept these optional parameters:
+    * `fields`: comma-separated list of task fields to send, e.g. `id,text`
+    * `sort`: `id` (default), `last_mod`, `deadline` or `reminder`, the order
+    of the tasks; the last two leave out the tasks without a deadline or a
+    reminder
+    * `status`, `parent_id`: only send the tasks with this status or parent
+    task (`0` for the top level tasks)
+    * `due_after`, `due_before`, `remind_after`, `remind_before`: timestamps;
+    only send the tasks with a deadline or a reminder in this range
+    (inclusive)
+    * `limit`: max number of tasks to send (up to 1000); if there are more
+    tasks, the response contains an `X-Next-Cursor` header
+    * `after`: value of the `X-Next-Cursor` header, used to get the next page
+    * `stream`: if set to `1`, the list is sent in chunks as the tasks are
+    loaded from the database (ignored with `limit`); meant for full exports
+    * `since`: timestamp; only the tasks changed at or after this time are
+    sent, together with the IDs of the tasks deleted since then (cannot be
+    combined with filters, nor be older than the deletion log retention
+    period; `0` sends every task and no deleted IDs):
+    ```
+    {
+        "tasks": [...], // same as the regular list
+        "deleted": [124, 125],
+        "time": 123456 // server time, to be used as `since` in the next request
+    }
+    ```
+    GET responses carry an `ETag` header. If it matches the `If-None-Match`
+    request header, the server responds with HTTP 304 and an empty body.
     With a GET request, this will be returned to an authenticated user:
     ```
     [
@@ -50,16 +111,56 @@ def task_request():
     """
     tc = TaskController(request.user)
     if request.method == "GET":
+        # the version is read first, so a concurrent change can only make the
+        # response newer than its tag
+        etag = request_etag(tc.get_version())
+        headers = etag_headers(etag)
+        if is_not_modified(etag):
+            return "", HTTPStatus.NOT_MODIFIED, headers
         query = request.args.get(API_QUERY, None)
         # `query` is OK to be `None`
-        tasks = tc.get_tasks(query)
-        tasksList = list()
-        for task in tasks:
-            tasksList.append(task.to_dict())
-        return dumps(tasksList)
+        fields = parse_fields(request.args.get(API_FIELDS))
+        limit = get_int_arg(API_LIMIT, MSG_INVALID_LIMIT)
+        since = get_int_arg(API_SINCE, MSG_INVALID_SINCE)
+        filters = dict()
+        for name in FILTERS:
+            value = get_int_arg(name, MSG_INVALID_FILTER)
+            if value is not None:
+                filters[name] = value
+        # only full listings are streamed
+        stream = string_to_bool(request.args.get(API_STREAM, "")) and limit is None \
+            and since is None
+        # taken before the query, so that the next delta includes all later changes
+        now = time()
+        tasks, cursor = tc.get_tasks(
+            query,
+            fields=fields,
+            limit=limit,
+            after=request.args.get(API_AFTER),
+            sort=request.args.get(API_SORT, API_ID),
+            stream=stream,
+            since=since,
+            filters=filters
+        )
+        serialize = row_serializer(fields)
+        if stream:
+            return stream_json_list(tasks, serialize), headers
+        deleted = None
+        if since is not None:
+            # `since=0` is a full resync: the client has no tasks to remove
+            deleted = tc.get_deleted(since) if since > 0 else list()
+        with timed("serialize"):
+            tasksList = [serialize(task) for task in tasks]
+            if since is None:
+                response = encode(tasksList)
+            else:
+                response = encode({API_TASKS: tasksList, API_DELETED: deleted, API_TIME: now})
+        if not cursor is None:
+            headers[NEXT_CURSOR_HEADER] = cursor
+        return response, headers
     if request.method == "POST":
         new_id = tc.add_task(request.json)
-        return dumps(new_id)
+        return encode(new_id)
     return EMPTY_RESP
 
 
@@ -82,6 +183,7 @@ def task_id_request(task_id: int):
         "deadline": 123457 // if applicable
     }
     ```
+    GET responses carry an `ETag` header, see `task_request()`.
     On PATCH and DELETE the user will get HTTP 200 with an empty response. On
     PATCH, this request body is expected (all of the parameters are optional):
     ```
@@ -96,11 +198,107 @@ def task_id_request(task_id: int):
     """
     tc = TaskController(request.user)
     if request.method == "GET":
+        etag = request_etag(tc.get_version())
+        headers = etag_headers(etag)
+        if is_not_modified(etag):
+            return "", HTTPStatus.NOT_MODIFIED, headers
         task = tc.get_task(task_id)
-        response = task.to_dict()
-        return dumps(response)
+        with timed("serialize"):
+            response = encode(task_to_dict(task))
+        return response, headers
     if request.method == "PATCH":
         tc.update_task(task_id, request.json)
     if request.method == "DELETE":
-        return dumps(tc.remove_task(task_id))
+        return encode(tc.remove_task(task_id))
     return EMPTY_RESP
+
+
+@task_handlers.route("/task/batch", methods=["POST"])
+@accepts_json
+@login_required
+def task_batch_request():
+    """
+    Handles requests to `/api/task/batch`. Accepts POST. Applies a list of
+    task operations in a single transaction, either all of them or none:
+    ```
+    [
+        {"op": "create", "ref": "new-1", "task": {"text": "Some task"}},
+        {"op": "create", "ref": "new-2", "task": {"text": "Subtask", "parent_id": "new-1"}},
+        {"op": "update", "id": 123, "task": {"status": 1, "parent_id": "new-1"}},
+        {"op": "delete", "id": 124}
+    ]
+    ```
+    `ref` is an optional temporary ID of a new task, which can be used in
+    place of its real ID in the operations that follow. On success, the
+    client gets the real IDs of the new tasks and the IDs of all of the
+    removed tasks:
+    ```
+    {
+        "ids": {"new-1": 125, "new-2": 126},
+        "deleted": [124]
+    }
+    ```
+    """
+    tc = TaskController(request.user)
+    refs, removed = tc.apply_batch(request.json)
+    return encode({API_IDS: refs, API_DELETED: removed})
+
+
+@task_handlers.route("/task/<task_id>/tree", methods=["GET"])
+@accepts_json
+@login_required
+def task_tree_request(task_id: int):
+    """
+    Handles requests to `/api/task/<id>/tree`. Accepts GET. Sends a task
+    together with all of its subtasks, loaded with a single query. Accepts
+    these optional parameters:
+    * `fields`: comma-separated list of task fields to send, see
+    `task_request()`
+    * `depth`: max number of levels of subtasks to send, `0` for the task only
+    * `status`: only send the subtasks with this status
+    * `flat`: if set to `1`, send a list of tasks, parents before their
+    children, instead of a nested object
+    By default, the user gets the task, every task holding its subtasks:
+    ```
+    {
+        "id": 123,
+        "text": "Some project",
+        ...
+        "children": [
+            {"id": 124, "text": "Some task", "parent_id": 123, ..., "children": []}
+        ]
+    }
+    ```
+    With `flat`, every task carries the number of levels it is below the
+    requested task:
+    ```
+    [
+        {"id": 123, "text": "Some project", ..., "depth": 0},
+        {"id": 124, "text": "Some task", "parent_id": 123, ..., "depth": 1}
+    ]
+    ```
+    In the nested form, the subtasks of the tasks filtered out by `status` are
+    left out too. GET responses carry an `ETag` header, see `task_request()`.
+    """
+    tc = TaskController(request.user)
+    etag = request_etag(tc.get_version())
+    headers = etag_headers(etag)
+    if is_not_modified(etag):
+        return "", HTTPStatus.NOT_MODIFIED, headers
+    fields = parse_fields(request.args.get(API_FIELDS))
+    records = tc.get_subtree(
+        task_id, fields, get_int_arg(API_DEPTH, MSG_INVALID_DEPTH),
+        get_int_arg(API_STATUS, MSG_INVALID_STATUS)
+    )
+    serialize = row_serializer(fields)
+    with timed("serialize"):
+        if string_to_bool(request.args.get(API_FLAT, "")):
+            tasks = list()
+            for record in records:
+                task = serialize(record)
+                task[API_DEPTH] = record.depth
+                tasks.append(task)
+            response = encode(tasks)
+        else:
+            response = encode(nest_subtree(records, serialize))
+    return response, headers
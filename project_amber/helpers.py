@@ -1,3 +1,5 @@
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from json import dumps, loads
 from time import time as time_lib
 
 
@@ -7,3 +9,23 @@ def time() -> int:
     getting fractions of seconds on some platforms.
     """
     return int(time_lib())
+
+
+def encode_cursor(values: list) -> str:
+    """
+    Serializes a list of JSON-compatible values into an opaque URL-safe
+    pagination cursor.
+    """
+    return urlsafe_b64encode(dumps(values, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list:
+    """
+    Reverses `encode_cursor()`. Raises `ValueError` if the cursor is not
+    valid.
+    """
+    # malformed base64 and JSON raise subclasses of `ValueError` already
+    values = loads(urlsafe_b64decode(cursor.encode()))
+    if not isinstance(values, list):
+        raise ValueError(cursor)
+    return values
@@ -0,0 +1,94 @@
+"""
+Request and SQL statement hooks shared by the request metrics and the
+diagnostics (see `project_amber.metrics` and `project_amber.diagnostics`).
+Every request and every statement is timed once, however many features
+subscribe to the timings, and nothing is installed until one of them does.
+"""
+from time import perf_counter
+from typing import Callable, List, Optional
+
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+StatementHook = Callable[[str, float], None]  # statement, duration in seconds
+StartHook = Callable[[], None]
+FinishHook = Callable[[float], None]  # request duration in seconds
+
+statement_hooks: List[StatementHook] = list()
+start_hooks: List[StartHook] = list()
+finish_hooks: List[FinishHook] = list()
+
+
+def before_cursor_execute(conn, *_):
+    conn.info.setdefault("hooks_start", []).append(perf_counter())
+
+
+def after_cursor_execute(conn, _cursor, statement, *_):
+    duration = perf_counter() - conn.info["hooks_start"].pop()
+    # only the statements of requests are reported
+    if not has_app_context() or g.get("request_start") is None:
+        return
+    for hook in statement_hooks:
+        hook(statement, duration)
+
+
+def handle_error(context):
+    # `after_cursor_execute` is not called for failed statements
+    if context.connection is not None and context.connection.info.get("hooks_start"):
+        context.connection.info["hooks_start"].pop()
+
+
+def start_request():
+    g.request_start = perf_counter()
+    for hook in start_hooks:
+        hook()
+
+
+def finish_request(_=None):
+    # runs after streamed responses are sent, so they are timed in full
+    start = g.pop("request_start", None)
+    if start is None:
+        return
+    duration = perf_counter() - start
+    for hook in finish_hooks:
+        hook(duration)
+
+
+def request_duration() -> Optional[float]:
+    """
+    Returns the time spent on the current request so far, in seconds, `None`
+    if there is no request or no feature has subscribed to the hooks.
+    """
+    if not has_app_context():
+        return None
+    start = g.get("request_start")
+    return None if start is None else perf_counter() - start
+
+
+def subscribe(
+    app,
+    on_statement: Optional[StatementHook] = None,
+    on_start: Optional[StartHook] = None,
+    on_finish: Optional[FinishHook] = None
+):
+    """
+    Subscribes a feature to the hooks: `on_statement` is called after every
+    SQL statement of a request, `on_start` at the start of every request,
+    and `on_finish` at its very end. Installs the hooks on the first
+    subscription.
+    """
+    if not event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+        event.listen(Engine, "handle_error", handle_error)
+    if not app.extensions.get("amber_hooks"):
+        app.extensions["amber_hooks"] = True
+        app.before_request(start_request)
+        app.teardown_request(finish_request)
+    if on_statement is not None:
+        statement_hooks.append(on_statement)
+    if on_start is not None:
+        start_hooks.append(on_start)
+    if on_finish is not None:
+        finish_hooks.append(on_finish)
@@ -1,7 +1,19 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import sys
+from json import dumps
+from queue import SimpleQueue
+from threading import Lock
+from time import monotonic
+from typing import Dict, Hashable, List, Optional, Tuple
 
 from project_amber.config import config
 
+TEXT_FORMAT = logging.BASIC_FORMAT
+LOG_FLUSH_INTERVAL = 1  # max seconds a batched record waits for a file write
+
 level = logging.INFO
 if config.loglevel == 0:
     level = logging.ERROR
@@ -12,6 +24,102 @@ logging.basicConfig(level=level)
 logger = logging.getLogger("amber_backend")
 
 
+class JSONFormatter(logging.Formatter):
+    """
+    Formats log records as single-line JSON objects.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pid": record.process
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return dumps(entry)
+
+
+class BatchingHandler(logging.handlers.MemoryHandler):
+    """
+    Buffers records for its target handler, writing them out once `capacity`
+    records are buffered, a warning or an error comes, or `LOG_FLUSH_INTERVAL`
+    seconds have passed since the last write.
+    """
+    def __init__(self, capacity: int, target: logging.Handler):
+        super().__init__(capacity, logging.WARNING, target)
+        self.last_flush = monotonic()
+
+    def shouldFlush(self, record: logging.LogRecord) -> bool:
+        return super().shouldFlush(record) or \
+            monotonic() - self.last_flush >= LOG_FLUSH_INTERVAL
+
+    def flush(self):
+        super().flush()
+        self.last_flush = monotonic()
+
+
+def make_log_handlers() -> List[logging.Handler]:
+    """
+    Creates the handlers doing the actual output: stderr, and the `log_file`
+    if it is set.
+    """
+    formatter = JSONFormatter() if config.log_format == "json" \
+        else logging.Formatter(TEXT_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler(sys.stderr)]
+    if config.log_file:
+        file_handler = logging.FileHandler(config.log_file, encoding="utf8")
+        file_handler.setFormatter(formatter)
+        handlers.append(BatchingHandler(config.log_batch_size, file_handler))
+    handlers[0].setFormatter(formatter)
+    return handlers
+
+
+# request threads only put records into a queue, a background thread of the
+# listener formats and writes them
+log_queue: SimpleQueue = SimpleQueue()
+log_handlers = make_log_handlers()
+queue_handler = logging.handlers.QueueHandler(log_queue)
+listener: Optional[logging.handlers.QueueListener] = None
+logger.addHandler(queue_handler)
+logger.propagate = False
+
+
+def start_listener():
+    """
+    Starts the background thread writing the queued log records. Forked
+    processes (uWSGI workers) get a new queue and listener of their own, as
+    the thread of the parent is not copied over on fork.
+    """
+    global log_queue, listener  # pylint: disable=global-statement
+    log_queue = SimpleQueue()
+    queue_handler.queue = log_queue
+    listener = logging.handlers.QueueListener(log_queue, *log_handlers)
+    listener.start()
+
+
+def stop_listener():
+    """
+    Writes out the records left in the queue and stops the background thread.
+    """
+    global listener  # pylint: disable=global-statement
+    if listener is not None:
+        listener.stop()
+        listener = None
+    for handler in log_handlers:
+        # the stream may be closed already at exit, as `logging.shutdown()` allows
+        try:
+            handler.flush()
+        except (OSError, ValueError):
+            pass
+
+
+start_listener()
+os.register_at_fork(after_in_child=start_listener)
+atexit.register(stop_listener)
+
+
 def log(message):
     """
     Wrapper for the logger calls. Only intended to be used in DB code.
@@ -32,3 +140,51 @@ def error(message):
     Wrapper for the error messages. Loglevel 0.
     """
     logger.error(message)
+
+
+class RateLimiter:
+    """
+    Lets through up to `rate` events per second for every key, counting the
+    ones over the limit. Safe to use from multiple request threads.
+    """
+    def __init__(self, rate: int):
+        self.rate = rate
+        self._windows: Dict[Hashable, Tuple[int, int, int]] = dict()
+        self._lock = Lock()
+
+    def check(self, key: Hashable) -> Optional[int]:
+        """
+        Returns `None` if the event is over the limit, otherwise the number
+        of events with the same key suppressed since the last one let through.
+        """
+        second = int(monotonic())
+        with self._lock:
+            window, passed, suppressed = self._windows.get(key, (second, 0, 0))
+            if window != second:
+                window, passed = second, 0
+            if passed >= self.rate:
+                self._windows[key] = (window, passed, suppressed + 1)
+                return None
+            self._windows[key] = (window, passed + 1, 0)
+            return suppressed
+
+
+http_error_limiter = RateLimiter(config.error_log_rate)
+
+
+def log_http_error(code: int, message: str, method: str, path: str):
+    """
+    Logs an error response, server errors as errors and the rest as warnings.
+    At most `error_log_rate` messages per second are logged for each status
+    code; the number of the suppressed ones is added to the next message.
+    """
+    level_ = logging.ERROR if code >= 500 else logging.WARNING
+    if not logger.isEnabledFor(level_):
+        return
+    suppressed = http_error_limiter.check(code)
+    if suppressed is None:
+        return
+    line = f"{method} {path}: {code} {message}"
+    if suppressed:
+        line += f" ({suppressed} similar messages suppressed)"
+    logger.log(level_, line)
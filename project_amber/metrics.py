@@ -0,0 +1,192 @@
+from collections import defaultdict
+from contextlib import nullcontext
+from threading import Lock
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from flask import g, has_app_context, request
+
+from project_amber.config import config
+from project_amber.const import SERVER_TIMING_HEADER
+from project_amber.hooks import subscribe, request_duration
+
+# upper bounds of the request latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PHASES = ("db", "serialize", "bcrypt")  # timed parts of a request, see `timed()`
+
+
+class RequestMetrics:
+    """
+    Holds the metrics of a single request: the number of SQL statements it
+    has issued, and the time spent in each of the `PHASES`.
+    """
+    __slots__ = ("statements", "timings")
+
+    def __init__(self):
+        self.statements = 0
+        self.timings: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+
+
+class EndpointMetrics:
+    """
+    Aggregated metrics of the requests to an endpoint.
+    """
+    __slots__ = ("requests", "statements", "timings", "duration", "buckets")
+
+    def __init__(self):
+        self.requests = 0
+        self.statements = 0
+        self.timings: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.duration = 0.0
+        self.buckets: List[int] = [0] * len(LATENCY_BUCKETS)
+
+
+class MetricsRegistry:
+    """
+    Metrics of all of the requests served by this process, per endpoint and
+    HTTP method. Safe to use from multiple request threads.
+    """
+    def __init__(self):
+        self._endpoints: Dict[Tuple[str, str], EndpointMetrics] = defaultdict(EndpointMetrics)
+        self._lock = Lock()
+
+    def observe(self, endpoint: str, method: str, metrics: RequestMetrics, duration: float):
+        """
+        Adds the metrics of a finished request.
+        """
+        with self._lock:
+            totals = self._endpoints[(endpoint, method)]
+            totals.requests += 1
+            totals.statements += metrics.statements
+            for phase, spent in metrics.timings.items():
+                totals.timings[phase] += spent
+            totals.duration += duration
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    totals.buckets[i] += 1
+
+    def render(self) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = [
+                "# HELP amber_request_duration_seconds Request latency.",
+                "# TYPE amber_request_duration_seconds histogram"
+            ]
+            for (endpoint, method), totals in endpoints:
+                labels = f'endpoint="{endpoint}",method="{method}"'
+                for bound, count in zip(LATENCY_BUCKETS, totals.buckets):
+                    lines.append(f'amber_request_duration_seconds_bucket{{{labels},le="{bound}"}} '
+                                 f"{count}")
+                lines.append(f'amber_request_duration_seconds_bucket{{{labels},le="+Inf"}} '
+                             f"{totals.requests}")
+                lines.append(f"amber_request_duration_seconds_sum{{{labels}}} {totals.duration}")
+                lines.append(f"amber_request_duration_seconds_count{{{labels}}} {totals.requests}")
+            lines.append("# HELP amber_db_statements_total SQL statements issued.")
+            lines.append("# TYPE amber_db_statements_total counter")
+            for (endpoint, method), totals in endpoints:
+                lines.append(f'amber_db_statements_total{{endpoint="{endpoint}",'
+                             f'method="{method}"}} {totals.statements}')
+            for phase in PHASES:
+                lines.append(f"# HELP amber_{phase}_seconds_total Time spent in {phase}.")
+                lines.append(f"# TYPE amber_{phase}_seconds_total counter")
+                for (endpoint, method), totals in endpoints:
+                    lines.append(f'amber_{phase}_seconds_total{{endpoint="{endpoint}",'
+                                 f'method="{method}"}} {totals.timings[phase]}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def current_metrics() -> Optional[RequestMetrics]:
+    """
+    Returns the metrics of the current request, `None` if metrics are
+    disabled or there is no request.
+    """
+    if not config.metrics or not has_app_context():
+        return None
+    return g.get("request_metrics")
+
+
+class PhaseTimer:
+    """
+    Context manager that adds the time spent in its block to a phase of a
+    request.
+    """
+    __slots__ = ("metrics", "phase", "start")
+
+    def __init__(self, metrics: RequestMetrics, phase: str):
+        self.metrics = metrics
+        self.phase = phase
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *_):
+        self.metrics.timings[self.phase] += perf_counter() - self.start
+
+
+NULL_TIMER = nullcontext()
+
+
+def timed(phase: str):
+    """
+    Returns a context manager that adds the time spent in its block to a
+    phase (one of `PHASES`) of the current request. Returns a shared no-op
+    context manager if metrics are disabled.
+    """
+    metrics = current_metrics()
+    if metrics is None:
+        return NULL_TIMER
+    return PhaseTimer(metrics, phase)
+
+
+def record_statement(_statement: str, duration: float):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.statements += 1
+        metrics.timings["db"] += duration
+
+
+def start_request():
+    g.request_metrics = RequestMetrics()
+
+
+def add_server_timing(response):
+    """
+    Describes the time spent on the request so far in the `Server-Timing`
+    header. Streamed responses only account for the part before streaming.
+    """
+    metrics = g.get("request_metrics")
+    if metrics is None:
+        return response
+    total = (request_duration() or 0.0) * 1000
+    entries = [f'db;desc="{metrics.statements} statements";dur={metrics.timings["db"] * 1000:.2f}']
+    entries.extend(f"{phase};dur={metrics.timings[phase] * 1000:.2f}" for phase in PHASES[1:])
+    entries.append(f"total;dur={total:.2f}")
+    response.headers[SERVER_TIMING_HEADER] = ", ".join(entries)
+    return response
+
+
+def finish_request(duration: float):
+    metrics = g.pop("request_metrics", None)
+    if metrics is None:
+        return
+    # runs after streamed responses are sent, so they are counted in full
+    registry.observe(request.endpoint or "unknown", request.method, metrics, duration)
+
+
+def init_metrics(app):
+    """
+    Subscribes the metrics to the request and SQLAlchemy hooks (see
+    `project_amber.hooks`). Nothing is installed unless the `metrics` config
+    value is set.
+    """
+    if not config.metrics:
+        return
+    subscribe(app, record_statement, start_request, finish_request)
+    app.after_request(add_server_timing)
@@ -0,0 +1,169 @@
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text, select, func
+
+from project_amber.db import db
+from project_amber.helpers import time
+from project_amber.logging import log
+from project_amber.models.schema import SchemaMigration
+from project_amber.models.task import TaskTree
+from project_amber.search import install_search
+
+LINK_BATCH_SIZE = 1000  # max number of closure table rows in a single INSERT
+
+
+def create_indexes(engine, *names: str) -> List[str]:
+    """
+    Creates the named indexes declared on the models if they are missing from
+    the database. `db.create_all()` only creates indexes together with new
+    tables, so databases created by older versions need this to pick up new
+    indexes. Returns the list of created index names.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = list()
+    for table in db.metadata.sorted_tables:
+        if not table.name in existing_tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in names and not index.name in existing:
+                index.create(bind=engine)
+                log(f"Created index {index.name}")
+                created.append(index.name)
+    return created
+
+
+def migrate_task_parents(engine):
+    """
+    Moves the task ancestry stored by older versions in the comma-separated
+    `task.parents` column to the `task_tree` closure table, then drops the
+    column. Dropping columns requires SQLite 3.35 or newer.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns("task")}
+    if not "parents" in columns:
+        return
+    with engine.begin() as conn:
+        tasks = conn.execute(text("SELECT id, parents FROM task")).fetchall()
+        links = list()
+        for task_id, parents in tasks:
+            links.append({"ancestor": task_id, "descendant": task_id, "depth": 0})
+            # the stored list starts from the top level task
+            pids = [int(pid) for pid in parents.split(",") if pid]
+            for depth, pid in enumerate(reversed(pids), start=1):
+                links.append({"ancestor": pid, "descendant": task_id, "depth": depth})
+        for i in range(0, len(links), LINK_BATCH_SIZE):
+            conn.execute(TaskTree.__table__.insert(), links[i:i + LINK_BATCH_SIZE])
+        conn.execute(text("ALTER TABLE task DROP COLUMN parents"))
+    log(f"Moved the ancestry of {len(tasks)} tasks to the task_tree table")
+
+
+def add_lookup_indexes(engine):
+    """
+    Adds the indexes serving auth token checks, session listings, task
+    listings and ancestry lookups.
+    """
+    create_indexes(
+        engine, "ix_session_user", "ix_session_token_auth", "ix_task_owner_last_mod",
+        "ix_task_tree_descendant"
+    )
+
+
+def add_filter_indexes(engine):
+    """
+    Adds the indexes serving task listings filtered or ordered by status,
+    deadline, reminder time or parent task.
+    """
+    create_indexes(
+        engine, "ix_task_owner_status", "ix_task_owner_deadline", "ix_task_owner_reminder",
+        "ix_task_owner_parent"
+    )
+
+
+def add_notification_queue(engine):
+    """
+    Adds the `task.notify_at` column the scheduler picks due reminders and
+    deadlines by, queues the notifications of the upcoming ones, then adds
+    the queue index.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns("task")}
+    if not "notify_at" in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE task ADD COLUMN notify_at BIGINT"))
+            # the earliest of the reminder and the deadline not in the past
+            conn.execute(text(
+                "UPDATE task SET notify_at = CASE "
+                "WHEN reminder >= :now AND (deadline IS NULL OR deadline < :now "
+                "OR reminder <= deadline) THEN reminder "
+                "WHEN deadline >= :now THEN deadline END "
+                "WHERE reminder >= :now OR deadline >= :now"
+            ), now=time())
+    create_indexes(engine, "ix_task_notify_at")
+
+
+Migration = Tuple[int, str, Callable]
+
+# Schema migrations in the order they are applied. Never change or remove an
+# entry once it is released, add a new one instead. Tables missing from the
+# database are created from the models before the migrations run.
+MIGRATIONS: Tuple[Migration, ...] = (
+    (1, "Move the task ancestry to the task_tree table", migrate_task_parents),
+    (2, "Add the session and task lookup indexes", add_lookup_indexes),
+    (3, "Add the task filter indexes", add_filter_indexes),
+    (4, "Add the reminder and deadline notification queue", add_notification_queue)
+)
+
+
+def get_schema_version(engine) -> int:
+    """
+    Returns the version of the last migration applied to the database, 0 if
+    there is none.
+    """
+    if not SchemaMigration.__tablename__ in inspect(engine).get_table_names():
+        return 0
+    with engine.connect() as conn:
+        version = conn.execute(select([func.max(SchemaMigration.version)])).scalar()
+    return version or 0
+
+
+def pending_migrations(engine) -> List[Migration]:
+    """
+    Returns the migrations not yet applied to the database.
+    """
+    version = get_schema_version(engine)
+    return [migration for migration in MIGRATIONS if migration[0] > version]
+
+
+def record_migrations(engine, migrations: List[Migration]):
+    """
+    Marks migrations as applied.
+    """
+    if not migrations:
+        return
+    with engine.begin() as conn:
+        conn.execute(SchemaMigration.__table__.insert(), [{
+            "version": version,
+            "name": name,
+            "applied_time": time()
+        } for version, name, _ in migrations])
+
+
+def migrate(engine) -> List[Migration]:
+    """
+    Brings the database schema up to date: creates the missing tables, then
+    applies the pending migrations. A database without any tables is created
+    from the models as is, so its migrations are only recorded. Returns the
+    list of migrations applied (or recorded).
+    """
+    fresh = not inspect(engine).get_table_names()
+    db.metadata.create_all(bind=engine)
+    pending = pending_migrations(engine)
+    for migration in pending:
+        version, name, apply = migration
+        if not fresh:
+            log(f"Applying migration {version}: {name}")
+            apply(engine)
+        record_migrations(engine, [migration])
+    # the search index depends on the config rather than the schema version
+    install_search(engine)
+    return pending
@@ -21,10 +21,14 @@ class Session(db.Model):
     """
     id = db.Column(db.Integer, primary_key=True)
     token = db.Column(db.String(256), unique=True, nullable=False)
-    user = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
     login_time = db.Column(db.Integer, nullable=False)
     address = db.Column(db.String(100), nullable=False)
 
+    # covers the auth check (token -> user ID, login time) without reading
+    # the table itself
+    __table_args__ = (db.Index("ix_session_token_auth", token, user, login_time), )
+
     def __repr__(self):
         return "<Session token='%s' user='%d' login_time='%d' ip='%s'>" % \
             self.token, self.user, self.login_time, self.address
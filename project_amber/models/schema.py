@@ -0,0 +1,11 @@
+from project_amber.db import db
+
+
+class SchemaMigration(db.Model):
+    """
+    Holds a row for every schema migration applied to the database (see
+    `project_amber.migrations`).
+    """
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(256), nullable=False)
+    applied_time = db.Column(db.BigInteger, nullable=False)
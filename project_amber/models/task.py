@@ -1,4 +1,6 @@
-from typing import List
+from collections import namedtuple
+from functools import lru_cache
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple
 
 from project_amber.db import db
 from project_amber.errors import BadRequest
@@ -6,7 +8,77 @@ from project_amber.handlers.const import API_ID, API_TEXT, API_STATUS, \
     API_LASTMOD, API_PID, API_DEADLINE, API_REMINDER
 from project_amber.helpers import time
 
-SEPARATOR = ","
+# public task fields, API name -> `Task` attribute
+PUBLIC_FIELDS = {
+    API_ID: "id",
+    API_TEXT: "text",
+    API_STATUS: "status",
+    API_LASTMOD: "last_mod_time",
+    API_PID: "parent_id",
+    API_DEADLINE: "deadline",
+    API_REMINDER: "reminder"
+}
+PUBLIC_FIELD_NAMES = tuple(PUBLIC_FIELDS)
+OPTIONAL_FIELDS = (API_PID, API_DEADLINE, API_REMINDER)  # omitted when not set
+
+
+def task_to_dict(row, fields: Iterable[str] = PUBLIC_FIELD_NAMES) -> dict:
+    """
+    Converts public data of a task to a dict that can be safely used in JSON
+    serialization. `row` can be a `Task` or a query result row holding the
+    columns of `fields` (API names, see `PUBLIC_FIELDS`). Returns the
+    resulting dict.
+    """
+    result = dict()
+    for field in fields:
+        value = getattr(row, PUBLIC_FIELDS[field])
+        if value or not field in OPTIONAL_FIELDS:
+            result[field] = value
+    return result
+
+
+def next_due(times: Iterable[Optional[int]], now: int) -> Optional[int]:
+    """
+    Returns the earliest of the reminder / deadline `times` that is not in
+    the past, `None` if there is none.
+    """
+    upcoming = [value for value in times if isinstance(value, int) and value >= now]
+    return min(upcoming) if upcoming else None
+
+
+@lru_cache(maxsize=None)
+def task_record(attrs: Tuple[str, ...]) -> Callable[[Iterable], Any]:
+    """
+    Returns the function that builds a record from a result row holding the
+    `Task` attributes `attrs`. Records are named tuples, as compact as plain
+    tuples and free of ORM bookkeeping, with a type per attribute
+    combination.
+    """
+    # the fields are only known at run time, so type checkers cannot see them
+    record_type: Any = namedtuple("TaskRecord", attrs)  # type: ignore[misc]
+    return record_type._make
+
+
+def row_serializer(fields: List[str]) -> Callable[[Sequence], dict]:
+    """
+    Returns a function that converts a task result row holding the columns
+    of `fields` (API names) in that order, possibly followed by more columns,
+    to the same dict `task_to_dict()` builds. Values are taken by position,
+    which is cheaper than looking up row attributes by name.
+    """
+    fields = list(fields)
+    optional = [(i, field) for i, field in enumerate(fields) if field in OPTIONAL_FIELDS]
+    if not optional:
+        return lambda row: dict(zip(fields, row))
+
+    def serialize(row: Sequence) -> dict:
+        result = dict(zip(fields, row))
+        for i, field in optional:
+            if not row[i]:
+                del result[field]
+        return result
+
+    return serialize
 
 
 class Task(db.Model):
@@ -23,7 +95,25 @@ class Task(db.Model):
     last_mod_time = db.Column(db.BigInteger, nullable=False)
     deadline = db.Column(db.BigInteger)
     reminder = db.Column(db.BigInteger)
-    parents = db.Column(db.String(2048), nullable=False)
+    # the time of the next reminder or deadline notification, see `schedule()`
+    notify_at = db.Column(db.BigInteger)
+
+    # serve listings ordered by modification time and delta sync, and
+    # filtered or ordered listings (see `FILTERS` in the task controller)
+    __table_args__ = (
+        db.Index("ix_task_owner_last_mod", owner, last_mod_time),
+        db.Index("ix_task_owner_status", owner, status),
+        db.Index("ix_task_owner_deadline", owner, deadline),
+        db.Index("ix_task_owner_reminder", owner, reminder),
+        db.Index("ix_task_owner_parent", owner, parent_id),
+        # the queue of due notifications; only holds tasks that have one
+        db.Index(
+            "ix_task_notify_at",
+            notify_at,
+            postgresql_where=notify_at.isnot(None),
+            sqlite_where=notify_at.isnot(None)
+        )
+    )
 
     def to_dict(self) -> dict:
         """
@@ -31,16 +121,7 @@ class Task(db.Model):
         modtime, deadline and reminders) to a dict that can be safely used in
         JSON serialization. Returns the resulting dict.
         """
-        result = {
-            API_ID: self.id,
-            API_TEXT: self.text,
-            API_STATUS: self.status,
-            API_LASTMOD: self.last_mod_time
-        }
-        if self.parent_id: result[API_PID] = self.parent_id
-        if self.deadline: result[API_DEADLINE] = self.deadline
-        if self.reminder: result[API_REMINDER] = self.reminder
-        return result
+        return task_to_dict(self)
 
     def merge(self, task: "Task"):
         """
@@ -50,6 +131,15 @@ class Task(db.Model):
             new_value = getattr(task, i)
             if new_value is not None:
                 setattr(self, i, new_value)
+        if task.reminder is not None or task.deadline is not None:
+            self.schedule(time())
+
+    def schedule(self, now: int):
+        """
+        Queues the notification of the next reminder or deadline of the task
+        for the scheduler (see `project_amber.scheduler`).
+        """
+        self.notify_at = next_due((self.reminder, self.deadline), now)
 
     def __init__(self, owner: int, data: dict = None):
         # TODO: should't throw HTTP errors from model code
@@ -63,8 +153,8 @@ class Task(db.Model):
         self.parent_id = data.get(API_PID)
         self.deadline = data.get(API_DEADLINE)
         self.reminder = data.get(API_REMINDER)
-        self.parents = ""
         self.owner = owner
+        self.schedule(self.creation_time)
 
     def add(self):
         """
@@ -78,20 +168,39 @@ class Task(db.Model):
         """
         db.session.delete(self)
 
-    def get_parents(self) -> List[int]:
-        """
-        Retrieves a list of connected parent IDs that have a higher tree level.
-        The list is deserialized from a string contained in the database.
-        """
-        if len(self.parents) == 0:
-            return list()
-        return list(map(lambda x: int(x), self.parents.split(SEPARATOR)))
 
-    def set_parents(self, pids: List[int]) -> str:
-        """
-        Serializes the provided list of connected parent IDs that have a higher
-        tree level into a string. Returns the resulting string.
-        """
-        pids_str = map(lambda x: str(x), pids)
-        self.parents = SEPARATOR.join(pids_str)
-        return self.parents
+class TaskTree(db.Model):
+    """
+    Closure table of the task hierarchy. Holds a row for every pair of a task
+    and its ancestor, `depth` being the number of tree levels between them.
+    Every task is also linked to itself with `depth` 0. The primary key serves
+    subtree lookups and ancestry checks, the descendant index serves lookups
+    of the ancestors of a task.
+    """
+    ancestor = db.Column(db.Integer, db.ForeignKey("task.id"), primary_key=True)
+    descendant = db.Column(
+        db.Integer, db.ForeignKey("task.id"), primary_key=True, index=True
+    )
+    depth = db.Column(db.Integer, nullable=False)
+
+
+class TaskTombstone(db.Model):
+    """
+    Deletion log entry. Holds the ID of a removed task, its owner and the
+    removal time, so that clients syncing changes can learn about removals.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, nullable=False)
+    owner = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    deletion_time = db.Column(db.BigInteger, nullable=False)
+
+    __table_args__ = (db.Index("ix_task_tombstone_owner_time", owner, deletion_time), )
+
+
+class TaskVersion(db.Model):
+    """
+    Version counter of the task list of a user. Incremented on every change
+    to the tasks of the user; used to build cheap entity tags.
+    """
+    owner = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False)
@@ -0,0 +1,51 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import Callable, Optional
+
+from project_amber.config import config
+from project_amber.const import MSG_SERVER_BUSY
+from project_amber.errors import ServiceUnavailable
+from project_amber.metrics import timed
+
+
+class BoundedPool:
+    """
+    Thread pool with admission control. Runs up to `workers` jobs at once
+    and lets up to `queue_size` more wait for a free worker; any job over
+    that limit is rejected right away with `ServiceUnavailable`, so request
+    threads do not pile up behind slow jobs. The threads are started on
+    first use, so that every forked uWSGI worker gets its own ones.
+    """
+    def __init__(self, workers: int, queue_size: int, name: str):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.name = name
+        self._slots = BoundedSemaphore(workers + queue_size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = 0
+        self._lock = Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=self.name)
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, fn: Callable, *args):
+        """
+        Runs `fn(*args)` in the pool, waits for it and returns its result.
+        Raises `ServiceUnavailable` if the pool is saturated.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ServiceUnavailable(MSG_SERVER_BUSY)
+        try:
+            with timed(self.name):
+                return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+
+# bcrypt releases the GIL while hashing, so threads run it in parallel
+password_pool = BoundedPool(config.bcrypt_workers, config.bcrypt_queue, "bcrypt")
@@ -0,0 +1,179 @@
+"""
+Reminder and deadline notifications. Runs as a separate worker process:
+
+    amber-scheduler [--once]   # or python -m project_amber.scheduler
+
+Every task with an upcoming reminder or deadline is queued by the time of
+its next notification (`task.notify_at`, see `Task.schedule()`). Workers
+claim the due tasks in batches, deliver their notifications to the sink set
+with the `scheduler_sink` config value, then queue the next notification of
+every task, all in one transaction per batch. Several workers can run at
+once: on PostgreSQL they claim batches with `FOR UPDATE SKIP LOCKED`, and a
+task is only queued again if nobody has done it first, so no notification
+is delivered twice while the workers run. A worker that crashes before
+committing leaves its batch due, so that another worker delivers it again.
+"""
+import signal
+import sys
+from argparse import ArgumentParser
+from threading import Event
+from typing import Dict, List, Optional
+from urllib.request import Request, urlopen
+
+from sqlalchemy import select, and_
+
+from project_amber.app import app
+from project_amber.config import config
+from project_amber.db import db
+from project_amber.encoding import encode
+from project_amber.handlers.const import API_USER, API_TASK, API_TIME, API_EVENT
+from project_amber.helpers import time
+from project_amber.logging import log, error
+from project_amber.models.auth import User
+from project_amber.models.task import Task, PUBLIC_FIELDS, next_due, row_serializer
+
+EVENT_REMINDER = "reminder"
+EVENT_DEADLINE = "deadline"
+WEBHOOK_TIMEOUT = 10  # seconds to wait for the webhook to respond
+
+
+class FileSink:
+    """
+    Appends notifications to a file, one JSON object per line. Stands in for
+    a real delivery channel in development and tests.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def deliver(self, notifications: List[Dict]):
+        with open(self.path, "ab") as sink_file:
+            sink_file.write(b"".join(encode(item) + b"\n" for item in notifications))
+
+
+class WebhookSink:
+    """
+    Sends notifications to a webhook, a batch at a time, as a JSON list in
+    the body of a POST request. Fails unless the webhook responds with HTTP
+    2xx, so that the batch is delivered again later.
+    """
+    def __init__(self, url: str):
+        self.url = url
+
+    def deliver(self, notifications: List[Dict]):
+        req = Request(
+            self.url, data=encode(notifications), headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        # `urlopen()` raises `HTTPError` on HTTP 4xx and 5xx
+        with urlopen(req, timeout=WEBHOOK_TIMEOUT):
+            pass
+
+
+def make_sink():
+    """
+    Creates the notification sink configured with `scheduler_*` config
+    values.
+    """
+    if config.scheduler_sink == "webhook":
+        if not config.scheduler_webhook:
+            print("No scheduler_webhook specified. Exiting.")
+            sys.exit(1)
+        return WebhookSink(config.scheduler_webhook)
+    return FileSink(config.scheduler_file)
+
+
+class Scheduler:
+    """
+    Claims due tasks in batches of `batch_size` and delivers their
+    notifications to `sink`.
+    """
+    def __init__(self, engine, sink, batch_size: int):
+        self.engine = engine
+        self.sink = sink
+        self.batch_size = batch_size
+        self.attrs = list(PUBLIC_FIELDS.values())
+        self.serialize = row_serializer(list(PUBLIC_FIELDS))
+
+    def notifications(self, row, now: int) -> List[Dict]:
+        """
+        Returns the notifications of the reminder and deadline of a claimed
+        task that are due, from its queued notification time up to `now`.
+        """
+        result = list()
+        for event, event_time in ((EVENT_REMINDER, row.reminder), (EVENT_DEADLINE, row.deadline)):
+            if isinstance(event_time, int) and row.notify_at <= event_time <= now:
+                result.append({
+                    API_EVENT: event,
+                    API_TIME: event_time,
+                    API_USER: row.name,
+                    API_TASK: self.serialize(row)
+                })
+        result.sort(key=lambda item: item[API_TIME])
+        return result
+
+    def run_once(self, now: Optional[int] = None) -> int:
+        """
+        Claims a batch of due tasks and delivers their notifications. Returns
+        the number of tasks claimed.
+        """
+        if now is None:
+            now = time()
+        columns = [getattr(Task, attr) for attr in self.attrs] + [Task.notify_at, User.name]
+        due = select(columns) \
+            .select_from(Task.__table__.join(User.__table__, User.id == Task.owner)) \
+            .where(Task.notify_at <= now).order_by(Task.notify_at).limit(self.batch_size) \
+            .with_for_update(of=Task.__table__, skip_locked=True)
+        with self.engine.begin() as conn:
+            rows = conn.execute(due).fetchall()
+            notifications = list()
+            for row in rows:
+                # a worker that has not seen the row locked may have claimed
+                # it already; then the queued time has changed
+                claimed = conn.execute(
+                    Task.__table__.update()
+                    .where(and_(Task.id == row.id, Task.notify_at == row.notify_at))
+                    .values(notify_at=next_due((row.reminder, row.deadline), now + 1))
+                ).rowcount
+                if claimed:
+                    notifications.extend(self.notifications(row, now))
+            if notifications:
+                self.sink.deliver(notifications)
+        if notifications:
+            log(f"Delivered {len(notifications)} task notifications")
+        return len(rows)
+
+    def run(self, interval: int, stop: Event):
+        """
+        Delivers due notifications until `stop` is set, checking for new ones
+        every `interval` seconds. Goes on right away while full batches are
+        due.
+        """
+        while not stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:  # pylint: disable=broad-except
+                error(f"Could not deliver task notifications: {e}")
+                claimed = 0
+            if claimed < self.batch_size:
+                stop.wait(interval)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = ArgumentParser(prog="amber-scheduler", description="Project Amber notifications")
+    parser.add_argument("--once", action="store_true", help="deliver one batch and exit")
+    args = parser.parse_args(argv)
+    with app.app_context():
+        engine = db.engine
+    scheduler = Scheduler(engine, make_sink(), config.scheduler_batch_size)
+    if args.once:
+        scheduler.run_once()
+        return
+    stop = Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    log("Scheduler started")
+    scheduler.run(config.scheduler_interval, stop)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
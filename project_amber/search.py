@@ -0,0 +1,180 @@
+from re import findall
+from typing import List, Optional
+
+from sqlalchemy import inspect, text, func, literal_column
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql import table, column
+
+from project_amber.config import config
+from project_amber.db import db
+from project_amber.logging import log, warn
+from project_amber.models.task import Task
+
+FTS_CONFIG = "simple"  # PostgreSQL text search configuration; no stemming
+SQLITE_FTS_TABLE = "task_fts"
+# the FTS5 table mirrors `task.text`, triggers keep it in sync with the tasks
+SQLITE_FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5"
+    "(text, content='task', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON task BEGIN "
+    "INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON task BEGIN "
+    "INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF text ON task BEGIN "
+    "INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text); END"
+)
+SQLITE_FTS_REBUILD = "INSERT INTO {fts}({fts}) VALUES ('rebuild')"
+SQLITE_FTS_DROP = (
+    "DROP TRIGGER IF EXISTS {fts}_insert",
+    "DROP TRIGGER IF EXISTS {fts}_delete",
+    "DROP TRIGGER IF EXISTS {fts}_update",
+    "DROP TABLE IF EXISTS {fts}"
+)
+
+
+def split_words(query: str) -> List[str]:
+    """
+    Splits a search query into words, dropping anything that could be
+    interpreted as full-text query syntax.
+    """
+    return findall(r"[^\W_]+", query)
+
+
+class SearchBackend:
+    """
+    Task text search. The base implementation does a case-insensitive
+    substring search with `ILIKE`, which needs no index and works with any
+    database, but scans every task of the user.
+    """
+    def install(self, engine):
+        """
+        Creates the database objects the backend needs. Safe to run more than
+        once.
+        """
+
+    def search(self, query, text_query: str):
+        """
+        Narrows down a `select()` of `Task` columns to the tasks matching the
+        search query, ordering them by relevance if the backend supports it.
+        """
+        escaped = text_query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return query.where(Task.text.ilike(f"%{escaped}%", escape="\\"))
+
+
+class PostgresSearch(SearchBackend):
+    """
+    Full-text search with a GIN index over the `tsvector` of the task text.
+    The index is an expression index, so PostgreSQL keeps it up to date on
+    every task insert, update and removal.
+    """
+    def _document(self):
+        # rendered with literals to match the indexed expression exactly
+        return func.to_tsvector(
+            literal_column(f"'{FTS_CONFIG}'"), func.coalesce(Task.text, literal_column("''"))
+        )
+
+    def install(self, engine):
+        engine.execute(
+            "CREATE INDEX IF NOT EXISTS ix_task_text_fts ON task "
+            f"USING gin (to_tsvector('{FTS_CONFIG}', coalesce(text, '')))"
+        )
+
+    def search(self, query, text_query: str):
+        words = split_words(text_query)
+        if not words:
+            return super().search(query, text_query)
+        # every word is matched as a prefix
+        ts_query = func.to_tsquery(FTS_CONFIG, " & ".join(f"'{word}':*" for word in words))
+        document = self._document()
+        return query.where(document.op("@@")(ts_query)) \
+            .order_by(func.ts_rank(document, ts_query).desc(), Task.id)
+
+
+class SQLiteSearch(SearchBackend):
+    """
+    Full-text search with an SQLite FTS5 table indexing the task text.
+    Triggers on the `task` table keep the index up to date.
+    """
+    fts = table(SQLITE_FTS_TABLE, column("rowid"), column("rank"))
+
+    def install(self, engine):
+        exists = SQLITE_FTS_TABLE in inspect(engine).get_table_names()
+        with engine.begin() as conn:
+            for statement in SQLITE_FTS_SCHEMA:
+                conn.execute(statement.format(fts=SQLITE_FTS_TABLE))
+            if not exists:
+                # index the tasks created before the index existed
+                conn.execute(SQLITE_FTS_REBUILD.format(fts=SQLITE_FTS_TABLE))
+                log("Built the task full-text search index")
+
+    def search(self, query, text_query: str):
+        words = split_words(text_query)
+        if not words:
+            return super().search(query, text_query)
+        # every word is matched as a prefix
+        match = " ".join(f'"{word}"*' for word in words)
+        return query.select_from(Task.__table__.join(self.fts, self.fts.c.rowid == Task.id)) \
+            .where(text(f"{SQLITE_FTS_TABLE} MATCH :match").bindparams(match=match)) \
+            .order_by(self.fts.c.rank, Task.id)
+
+
+def make_search_backend(engine) -> SearchBackend:
+    """
+    Picks the search backend for a database: full-text search on PostgreSQL
+    and SQLite (if the FTS5 table is installed), `ILIKE` otherwise or if the
+    `search_backend` config value is set to `like`.
+    """
+    if config.search_backend == "like":
+        return SearchBackend()
+    if engine.dialect.name == "postgresql":
+        return PostgresSearch()
+    if engine.dialect.name == "sqlite" and SQLITE_FTS_TABLE in inspect(engine).get_table_names():
+        return SQLiteSearch()
+    return SearchBackend()
+
+
+def install_search(engine):
+    """
+    Creates the full-text search index for a database, if there is a
+    full-text search backend for it.
+    """
+    if config.search_backend == "like":
+        return
+    backend: Optional[SearchBackend] = None
+    if engine.dialect.name == "postgresql":
+        backend = PostgresSearch()
+    if engine.dialect.name == "sqlite":
+        backend = SQLiteSearch()
+    if backend is None:
+        return
+    try:
+        backend.install(engine)
+    except OperationalError as e:
+        warn(f"Could not create the full-text search index, falling back to ILIKE: {e}")
+
+
+def drop_search(engine):
+    """
+    Drops the full-text search objects `db.drop_all()` does not know about:
+    the SQLite FTS5 table and its triggers. The PostgreSQL index goes away
+    with the `task` table.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for statement in SQLITE_FTS_DROP:
+            conn.execute(statement.format(fts=SQLITE_FTS_TABLE))
+
+
+_backend: Optional[SearchBackend] = None
+
+
+def get_search_backend() -> SearchBackend:
+    """
+    Returns the search backend for the app database.
+    """
+    global _backend  # pylint: disable=global-statement
+    if _backend is None:
+        _backend = make_search_backend(db.engine)
+    return _backend
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from setuptools import setup
+from setuptools import setup, find_namespace_packages
 
 setup(
     name="project_amber",
@@ -17,7 +17,15 @@ setup(
     ],
     keywords="tasks backend flask",
     project_urls={"Homepage": "https://git.tdem.in/tdemin/amber"},
-    packages=["project_amber"],
+    # `controllers` and `models` are namespace packages
+    packages=find_namespace_packages(include=["project_amber", "project_amber.*"]),
     install_requires=["flask", "flask-cors", "flask-sqlalchemy", "bcrypt"],
-    python_requires=">=3.8"
+    extras_require={"orjson": ["orjson"]},
+    python_requires=">=3.8",
+    entry_points={
+        "console_scripts": [
+            "amber-admin = project_amber.cli:main",
+            "amber-scheduler = project_amber.scheduler:main"
+        ]
+    }
 )
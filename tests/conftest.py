@@ -0,0 +1,74 @@
+"""
+Shared fixtures. `project_amber.config` reads `config.json` from the working
+directory at import time, so the app is imported from a temporary directory
+holding a config for an SQLite database in it. Every test starts with an
+empty database and a signed up user.
+"""
+import json
+import os
+import tempfile
+
+import pytest
+
+WORKDIR = tempfile.mkdtemp(prefix="amber-test-")
+SETTINGS = {
+    "database": f"sqlite:///{WORKDIR}/amber.db",
+    "allow_signup": True,
+    "loglevel": 0,
+    "bcrypt_rounds": 4  # the lowest cost bcrypt accepts, to keep logins fast
+}
+
+with open(os.path.join(WORKDIR, "config.json"), "w", encoding="utf8") as config_file:
+    json.dump(SETTINGS, config_file)
+_cwd = os.getcwd()
+os.chdir(WORKDIR)
+# pylint: disable=wrong-import-position
+from project_amber.app import app
+from project_amber.db import db
+from project_amber.migrations import migrate
+from project_amber.models.task import Task, TaskTree
+from project_amber.search import drop_search
+os.chdir(_cwd)
+
+
+@pytest.fixture
+def client():
+    with app.app_context():
+        drop_search(db.engine)
+        db.drop_all()
+        migrate(db.engine)
+    return app.test_client()
+
+
+@pytest.fixture
+def auth(client):
+    """
+    Signs up and logs in a user. Returns the request headers authenticating
+    them.
+    """
+    credentials = {"username": "user", "password": "password"}
+    client.post("/v0/signup", json=credentials)
+    token = client.post("/v0/login", json=credentials).get_json()["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def check_tree():
+    """
+    Returns a function asserting that the closure table holds exactly the
+    links that follow from the parent IDs of the tasks.
+    """
+    def check():
+        with app.app_context():
+            parents = dict(db.session.query(Task.id, Task.parent_id))
+            links = {(link.ancestor, link.descendant, link.depth)
+                     for link in db.session.query(TaskTree)}
+        expected = set()
+        for task_id in parents:
+            ancestor, depth = task_id, 0
+            while ancestor:
+                expected.add((ancestor, task_id, depth))
+                ancestor, depth = parents[ancestor], depth + 1
+        assert links == expected
+
+    return check
@@ -0,0 +1,154 @@
+"""
+Batch task operations (`POST /v0/task/batch`).
+"""
+from project_amber.const import MSG_UNKNOWN_REF, MSG_TASK_DANGEROUS, MSG_TASK_NOT_FOUND, \
+    MSG_DUPLICATE_REF
+
+
+def create_task(client, auth, text, parent_id=None):
+    data = {"text": text}
+    if parent_id is not None:
+        data["parent_id"] = parent_id
+    return client.post("/v0/task", json=data, headers=auth).get_json()
+
+
+def get_tasks(client, auth):
+    return {task["id"]: task for task in client.get("/v0/task", headers=auth).get_json()}
+
+
+def test_refs_resolve_to_new_tasks(client, auth, check_tree):
+    existing = create_task(client, auth, "existing")
+    resp = client.post(
+        "/v0/task/batch",
+        json=[
+            {"op": "create", "ref": "a", "task": {"text": "a"}},
+            {"op": "create", "ref": "b", "task": {"text": "b", "parent_id": "a"}},
+            {"op": "update", "id": existing, "task": {"parent_id": "b"}},
+            {"op": "update", "id": "a", "task": {"text": "a2"}}
+        ],
+        headers=auth
+    )
+    assert resp.status_code == 200
+    ids = resp.get_json()["ids"]
+    assert set(ids) == {"a", "b"}
+    tasks = get_tasks(client, auth)
+    assert tasks[ids["a"]]["text"] == "a2"
+    assert tasks[ids["b"]]["parent_id"] == ids["a"]
+    assert tasks[existing]["parent_id"] == ids["b"]
+    check_tree()
+
+
+def test_unknown_ref_is_rejected(client, auth):
+    existing = create_task(client, auth, "existing")
+    for operation in (
+        {"op": "update", "id": existing, "task": {"parent_id": "missing"}},
+        {"op": "update", "id": "missing", "task": {"text": "x"}},
+        {"op": "delete", "id": "missing"}
+    ):
+        resp = client.post("/v0/task/batch", json=[operation], headers=auth)
+        assert resp.status_code == 400
+        assert resp.get_json()["message"] == MSG_UNKNOWN_REF
+
+
+def test_ref_cannot_be_used_before_its_creation(client, auth):
+    resp = client.post(
+        "/v0/task/batch",
+        json=[
+            {"op": "create", "task": {"text": "child", "parent_id": "later"}},
+            {"op": "create", "ref": "later", "task": {"text": "parent"}}
+        ],
+        headers=auth
+    )
+    assert resp.status_code == 400
+    assert resp.get_json()["message"] == MSG_UNKNOWN_REF
+
+
+def test_duplicate_refs_are_rejected(client, auth):
+    resp = client.post(
+        "/v0/task/batch",
+        json=[
+            {"op": "create", "ref": "a", "task": {"text": "a"}},
+            {"op": "create", "ref": "a", "task": {"text": "b"}}
+        ],
+        headers=auth
+    )
+    assert resp.status_code == 400
+    assert resp.get_json()["message"] == MSG_DUPLICATE_REF
+    assert get_tasks(client, auth) == dict()
+
+
+def test_failed_operation_rolls_back_the_batch(client, auth, check_tree):
+    kept = create_task(client, auth, "kept")
+    removed = create_task(client, auth, "removed")
+    before = get_tasks(client, auth)
+    version = client.get("/v0/task", headers=auth).headers["ETag"]
+    resp = client.post(
+        "/v0/task/batch",
+        json=[
+            {"op": "create", "ref": "new", "task": {"text": "new"}},
+            {"op": "update", "id": kept, "task": {"text": "changed", "parent_id": "new"}},
+            {"op": "delete", "id": removed},
+            {"op": "update", "id": "new", "task": {"parent_id": 999999}}
+        ],
+        headers=auth
+    )
+    assert resp.status_code == 404
+    assert resp.get_json()["message"] == MSG_TASK_NOT_FOUND
+    assert get_tasks(client, auth) == before
+    assert client.get("/v0/task", headers=auth).headers["ETag"] == version
+    check_tree()
+
+
+def test_cycles_are_rejected(client, auth, check_tree):
+    top = create_task(client, auth, "top")
+    child = create_task(client, auth, "child", top)
+    grandchild = create_task(client, auth, "grandchild", child)
+    for task_id, parent_id in ((top, grandchild), (top, child), (child, child)):
+        resp = client.post(
+            "/v0/task/batch",
+            json=[{"op": "update", "id": task_id, "task": {"parent_id": parent_id}}],
+            headers=auth
+        )
+        assert resp.status_code == 400
+        assert resp.get_json()["message"] == MSG_TASK_DANGEROUS
+    # a cycle through a move made earlier in the same batch
+    resp = client.post(
+        "/v0/task/batch",
+        json=[
+            {"op": "create", "ref": "new", "task": {"text": "new"}},
+            {"op": "update", "id": top, "task": {"parent_id": "new"}},
+            {"op": "update", "id": "new", "task": {"parent_id": grandchild}}
+        ],
+        headers=auth
+    )
+    assert resp.status_code == 400
+    assert resp.get_json()["message"] == MSG_TASK_DANGEROUS
+    resp = client.patch(f"/v0/task/{top}", json={"parent_id": grandchild}, headers=auth)
+    assert resp.status_code == 400
+    tasks = get_tasks(client, auth)
+    assert "parent_id" not in tasks[top]
+    assert tasks[child]["parent_id"] == top
+    check_tree()
+
+
+def test_delete_removes_the_subtree(client, auth, check_tree):
+    top = create_task(client, auth, "top")
+    child = create_task(client, auth, "child", top)
+    grandchild = create_task(client, auth, "grandchild", child)
+    other = create_task(client, auth, "other")
+    resp = client.post(
+        "/v0/task/batch",
+        json=[
+            {"op": "create", "ref": "new", "task": {"text": "new", "parent_id": grandchild}},
+            {"op": "delete", "id": child}
+        ],
+        headers=auth
+    )
+    assert resp.status_code == 200
+    body = resp.get_json()
+    new = body["ids"]["new"]
+    assert set(body["deleted"]) == {child, grandchild, new}
+    # subtasks go before their parents
+    assert body["deleted"][-1] == child
+    assert set(get_tasks(client, auth)) == {top, other}
+    check_tree()
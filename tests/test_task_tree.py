@@ -0,0 +1,77 @@
+"""
+Task hierarchy: closure table links after creations, moves and removals.
+"""
+from project_amber.app import app
+from project_amber.db import db
+from project_amber.models.task import TaskTree
+
+
+def create_task(client, auth, text, parent_id=None):
+    data = {"text": text}
+    if parent_id is not None:
+        data["parent_id"] = parent_id
+    return client.post("/v0/task", json=data, headers=auth).get_json()
+
+
+def subtree_links(task_id):
+    with app.app_context():
+        return {(link.descendant, link.depth)
+                for link in db.session.query(TaskTree).filter_by(ancestor=task_id)}
+
+
+def test_move_relinks_the_subtree(client, auth, check_tree):
+    top = create_task(client, auth, "top")
+    child = create_task(client, auth, "child", top)
+    grandchild = create_task(client, auth, "grandchild", child)
+    other = create_task(client, auth, "other")
+    check_tree()
+    assert subtree_links(top) == {(top, 0), (child, 1), (grandchild, 2)}
+
+    resp = client.patch(f"/v0/task/{child}", json={"parent_id": other}, headers=auth)
+    assert resp.status_code == 200
+    check_tree()
+    assert subtree_links(top) == {(top, 0)}
+    assert subtree_links(other) == {(other, 0), (child, 1), (grandchild, 2)}
+
+    # parent ID 0 moves a task to the top level
+    resp = client.patch(f"/v0/task/{child}", json={"parent_id": 0}, headers=auth)
+    assert resp.status_code == 200
+    check_tree()
+    assert subtree_links(other) == {(other, 0)}
+    assert subtree_links(child) == {(child, 0), (grandchild, 1)}
+
+
+def test_batch_moves_relink_the_subtree(client, auth, check_tree):
+    top = create_task(client, auth, "top")
+    child = create_task(client, auth, "child", top)
+    grandchild = create_task(client, auth, "grandchild", child)
+    resp = client.post(
+        "/v0/task/batch",
+        json=[
+            {"op": "create", "ref": "new", "task": {"text": "new"}},
+            {"op": "update", "id": child, "task": {"parent_id": "new"}},
+            {"op": "update", "id": grandchild, "task": {"parent_id": top}},
+            {"op": "update", "id": "new", "task": {"parent_id": top}}
+        ],
+        headers=auth
+    )
+    assert resp.status_code == 200
+    new = resp.get_json()["ids"]["new"]
+    check_tree()
+    assert subtree_links(top) == {(top, 0), (new, 1), (child, 2), (grandchild, 1)}
+
+
+def test_delete_removes_the_subtree_links(client, auth, check_tree):
+    top = create_task(client, auth, "top")
+    child = create_task(client, auth, "child", top)
+    grandchild = create_task(client, auth, "grandchild", child)
+    sibling = create_task(client, auth, "sibling", top)
+
+    resp = client.delete(f"/v0/task/{child}", headers=auth)
+    assert resp.status_code == 200
+    check_tree()
+    assert subtree_links(top) == {(top, 0), (sibling, 1)}
+    assert subtree_links(child) == set()
+    assert subtree_links(grandchild) == set()
+    tasks = client.get("/v0/task", headers=auth).get_json()
+    assert {task["id"] for task in tasks} == {top, sibling}